@@ -53,6 +53,11 @@ if not apps.is_installed('stockman.contrib.admin_unfold'):
                            'batch', '_quantity', 'metadata', 'created_at', 'updated_at']
         date_hierarchy = 'target_date'
         ordering = ['-target_date', 'position']
+        list_select_related = ['position']
+
+        def get_queryset(self, request):
+            # held/available read the annotation instead of querying per row
+            return super().get_queryset(request).with_held()
 
         def has_add_permission(self, request):
             return False
@@ -84,6 +89,7 @@ if not apps.is_installed('stockman.contrib.admin_unfold'):
         """Move admin — read-only. Immutable audit trail."""
 
         list_display = ['timestamp', 'quant', 'delta', 'reason', 'user']
+        list_select_related = ['quant', 'user']
         list_filter = ['timestamp', 'user']
         search_fields = ['reason']
         readonly_fields = ['quant', 'delta', 'reference_type', 'reference_id',
@@ -116,6 +122,10 @@ if not apps.is_installed('stockman.contrib.admin_unfold'):
                            'purpose_id', 'metadata', 'created_at', 'resolved_at']
         actions = ['release_holds']
 
+        def get_queryset(self, request):
+            # One query per product ContentType for product_display
+            return super().get_queryset(request).prefetch_related('product')
+
         def has_add_permission(self, request):
             return False
 
@@ -7,6 +7,8 @@ Usage in settings.py:
         "HOLD_TTL_MINUTES": 30,
         "EXPIRED_BATCH_SIZE": 200,
         "VALIDATE_INPUT_SKUS": True,
+        "AVAILABILITY_CACHE_TTL": 2.0,
+        "QUERY_ISOLATION_LEVEL": "READ COMMITTED",
     }
 """
 
@@ -32,6 +34,13 @@ class StockmanSettings:
     # Validate SKUs via external backend before stock operations
     VALIDATE_INPUT_SKUS: bool = True
 
+    # Seconds to cache available()/committed() per process (0 = disabled)
+    AVAILABILITY_CACHE_TTL: float = 0
+
+    # Isolation for read-only queries outside transactions, PostgreSQL only
+    # ("READ COMMITTED" or "REPEATABLE READ"; "" = connection default)
+    QUERY_ISOLATION_LEVEL: str = ""
+
 
 def get_stockman_settings() -> StockmanSettings:
     """Load settings from Django settings."""
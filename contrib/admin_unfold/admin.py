@@ -78,10 +78,15 @@ class QuantAdmin(BaseModelAdmin):
     readonly_fields = ['content_type', 'object_id', 'position', 'target_date', '_quantity', 'created_at', 'updated_at']
     date_hierarchy = 'target_date'
     ordering = ['-target_date', 'position']
+    list_select_related = ['position']
 
     # Unfold options
     compressed_fields = True
 
+    def get_queryset(self, request):
+        # held/available read the annotation instead of querying per row
+        return super().get_queryset(request).with_held().prefetch_related('product')
+
     def has_add_permission(self, request):
         return False
 
@@ -140,6 +145,11 @@ class MoveAdmin(BaseModelAdmin):
     list_filter = ['timestamp', 'user']
     search_fields = ['reason']
     readonly_fields = ['quant', 'delta', 'reference_type', 'reference_id', 'reason', 'metadata', 'timestamp', 'user']
+    list_select_related = ['quant', 'user']
+
+    def get_queryset(self, request):
+        # quant_display shows the quant's product
+        return super().get_queryset(request).prefetch_related('quant__product')
 
     def has_add_permission(self, request):
         return False
@@ -194,6 +204,10 @@ class HoldAdmin(BaseModelAdmin):
     # Unfold options
     compressed_fields = True
 
+    def get_queryset(self, request):
+        # One query per product ContentType for product_display
+        return super().get_queryset(request).prefetch_related('product')
+
     def has_add_permission(self, request):
         return False
 
@@ -7,10 +7,9 @@ Usage:
 """
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
 from stockman import stock
-from stockman.models import Hold, HoldStatus
+from stockman.models import Hold
 
 
 class Command(BaseCommand):
@@ -27,10 +26,7 @@ class Command(BaseCommand):
     
     def handle(self, *args, **options):
         if options['dry_run']:
-            expired = Hold.objects.filter(
-                status__in=[HoldStatus.PENDING, HoldStatus.CONFIRMED],
-                expires_at__lt=timezone.now()
-            ).count()
+            expired = Hold.objects.expired().count()
             
             self.stdout.write(f'{expired} bloqueio(s) seria(m) liberado(s)')
         else:
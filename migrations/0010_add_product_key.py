@@ -0,0 +1,53 @@
+# Generated manually — packs (content_type_id, object_id) into one indexed
+# bigint on Quant and Hold; product lookups use it instead of the
+# two-column indexes it replaces.
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def product_key_field():
+    return models.GeneratedField(
+        db_persist=True,
+        editable=False,
+        expression=django.db.models.functions.comparison.Cast(
+            'content_type', models.BigIntegerField()
+        ).bitleftshift(32).bitor(models.F('object_id')),
+        output_field=models.BigIntegerField(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockman', '0009_remove_dead_quant_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quant',
+            name='product_key',
+            field=product_key_field(),
+        ),
+        migrations.AddField(
+            model_name='hold',
+            name='product_key',
+            field=product_key_field(),
+        ),
+        migrations.RemoveIndex(
+            model_name='quant',
+            name='stockman_qu_content_44478d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='hold',
+            name='stockman_ho_content_44181c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quant',
+            index=models.Index(fields=['product_key'], name='stockman_qu_product_d2e708_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hold',
+            index=models.Index(fields=['product_key', 'target_date'], name='stockman_ho_product_ded364_idx'),
+        ),
+    ]
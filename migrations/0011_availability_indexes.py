@@ -0,0 +1,34 @@
+# Generated manually — widens the product_key indexes to cover the whole
+# available() predicate: Quant by (product, date window), Hold by
+# (product, date, status, expiry), so active holds resolve in the index.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockman', '0010_add_product_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='quant',
+            name='stockman_qu_product_d2e708_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='hold',
+            name='stockman_ho_product_ded364_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quant',
+            index=models.Index(fields=['product_key', 'target_date'], name='stockman_qu_product_231626_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hold',
+            index=models.Index(
+                fields=['product_key', 'target_date', 'status', 'expires_at'],
+                name='stockman_ho_product_d56a4a_idx',
+            ),
+        ),
+    ]
@@ -12,25 +12,43 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from stockman.models.enums import HoldStatus
+from stockman.models.product_key import product_key_field
+
+# Statuses that still reserve stock (subject to expires_at)
+ACTIVE_HOLD_STATUSES = (HoldStatus.PENDING, HoldStatus.CONFIRMED)
+
+
+def not_expired_q(now, prefix: str = '') -> Q:
+    """
+    Q for holds that have not expired at `now`.
+
+    Args:
+        now: Reference datetime
+        prefix: Lookup prefix when filtering through a relation (e.g. 'holds__')
+    """
+    return (
+        Q(**{f'{prefix}expires_at__isnull': True})
+        | Q(**{f'{prefix}expires_at__gte': now})
+    )
+
+
+def active_q(now=None) -> Q:
+    """Q for active holds: PENDING/CONFIRMED and not expired at `now`."""
+    return not_expired_q(now or timezone.now()) & Q(status__in=ACTIVE_HOLD_STATUSES)
 
 
 class HoldQuerySet(models.QuerySet):
     """Custom QuerySet for Hold with convenience filters."""
 
-    def active(self):
+    def active(self, now=None):
         """Active holds: PENDING/CONFIRMED and not expired."""
-        now = timezone.now()
-        return self.filter(
-            status__in=[HoldStatus.PENDING, HoldStatus.CONFIRMED],
-        ).filter(
-            Q(expires_at__isnull=True) | Q(expires_at__gte=now)
-        )
+        return self.filter(active_q(now))
 
-    def expired(self):
+    def expired(self, now=None):
         """Expired holds: PENDING/CONFIRMED with expires_at in the past."""
-        now = timezone.now()
+        now = now or timezone.now()
         return self.filter(
-            status__in=[HoldStatus.PENDING, HoldStatus.CONFIRMED],
+            status__in=ACTIVE_HOLD_STATUSES,
             expires_at__lt=now,
         )
 
@@ -77,6 +95,8 @@ class Hold(models.Model):
     )
     object_id = models.PositiveIntegerField(verbose_name=_('ID do Produto'))
     product = GenericForeignKey('content_type', 'object_id')
+    # content_type_id << 32 | object_id, for single-column product lookups
+    product_key = product_key_field()
     
     # Link to stock (None = demand)
     quant = models.ForeignKey(
@@ -143,7 +163,7 @@ class Hold(models.Model):
         verbose_name_plural = _('Reservas')
         indexes = [
             models.Index(fields=['status', 'expires_at']),
-            models.Index(fields=['content_type', 'object_id', 'target_date']),
+            models.Index(fields=['product_key', 'target_date', 'status', 'expires_at']),
             models.Index(fields=['status', 'quant']),
         ]
     
@@ -166,7 +186,7 @@ class Hold(models.Model):
         1. Status is PENDING or CONFIRMED
         2. AND either has no expiration OR expiration is in the future
         """
-        if self.status not in [HoldStatus.PENDING, HoldStatus.CONFIRMED]:
+        if self.status not in ACTIVE_HOLD_STATUSES:
             return False
         if self.expires_at is None:
             return True
@@ -2,17 +2,63 @@
 Move model — Immutable ledger of quantity changes.
 """
 
+from collections import defaultdict
 from decimal import Decimal
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models, transaction
-from django.db.models import F
+from django.db.models import Case, F, Value, When
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+class MoveQuerySet(models.QuerySet):
+    """QuerySet for Move that keeps Quant caches in sync on bulk inserts."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Insert moves and apply their deltas to Quant._quantity.
+
+        Same guarantees as Move.save(), but with one INSERT for all moves
+        and one UPDATE for all affected quants (per-quant deltas summed).
+        """
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            raise ValueError("Movimentos não suportam ignore/update de conflitos.")
+
+        objs = list(objs)
+        deltas = defaultdict(Decimal)
+        for move in objs:
+            if move.pk:
+                raise ValueError(
+                    "Movimentos são imutáveis. "
+                    "Para corrigir, crie um novo Move com delta inverso."
+                )
+            if not move.reason:
+                raise ValueError("Motivo é obrigatório")
+            delta = move.delta
+            if not isinstance(delta, Decimal):
+                # via str() so floats keep their shortest repr
+                delta = Decimal(str(delta))
+            deltas[move.quant_id] += delta
+
+        # Import here to avoid circular import
+        from stockman.models.quant import Quant
+
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if deltas:
+                Quant.objects.filter(pk__in=deltas).update(
+                    _quantity=F('_quantity') + Case(
+                        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                        output_field=models.DecimalField(max_digits=12, decimal_places=3),
+                    ),
+                    updated_at=timezone.now(),
+                )
+        return created
+
+
 class Move(models.Model):
     """
     Immutable record of quantity change.
@@ -20,7 +66,7 @@ class Move(models.Model):
     Rules:
     - NEVER update() or delete()
     - Corrections are new Moves with inverse delta
-    - Updates Quant._quantity atomically on save()
+    - Updates Quant._quantity atomically on save() and bulk_create()
     
     This is the ONLY model that changes quantity.
     """
@@ -66,6 +112,8 @@ class Move(models.Model):
         blank=True,
         verbose_name=_('Usuário'),
     )
+
+    objects = MoveQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Movimento')
@@ -0,0 +1,44 @@
+"""
+Product key — both halves of the generic product reference in one integer.
+
+Quant and Hold are always filtered by (content_type_id, object_id)
+together. The stored generated column product_key packs them as
+content_type_id << 32 | object_id, so those lookups (and GROUP BY
+product) use a single narrow bigint index instead of a two-column one.
+"""
+
+from django.db import models
+from django.db.models import F
+from django.db.models.functions import Cast
+
+# object_id is a PositiveIntegerField (< 2**31), so it fits the low half
+PRODUCT_KEY_SHIFT = 32
+
+
+def pack_product_key(content_type_id: int, object_id: int) -> int:
+    """Python-side equivalent of the product_key column."""
+    return (content_type_id << PRODUCT_KEY_SHIFT) | object_id
+
+
+def product_key_expression():
+    """
+    SQL expression computing product_key from content_type/object_id.
+
+    Lets models without the stored column (e.g. StockAlert) annotate it
+    and be matched against the indexed product_key of Quant and Hold.
+    """
+    return (
+        Cast('content_type', models.BigIntegerField())
+        .bitleftshift(PRODUCT_KEY_SHIFT)
+        .bitor(F('object_id'))
+    )
+
+
+def product_key_field() -> models.GeneratedField:
+    """Stored generated product_key column for models with content_type/object_id."""
+    return models.GeneratedField(
+        expression=product_key_expression(),
+        output_field=models.BigIntegerField(),
+        db_persist=True,
+        editable=False,
+    )
@@ -9,20 +9,23 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import Q, Sum
+from django.db.models import OuterRef, Q, Subquery, Sum
 from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 from stockman.models.enums import HoldStatus
+from stockman.models.product_key import product_key_field
 
 
-class QuantManager(models.Manager):
-    """Manager with helper methods for Quant queries."""
+class QuantQuerySet(models.QuerySet):
+    """QuerySet with helper methods for Quant queries."""
     
     def for_product(self, product):
         """Filter quants for a specific product."""
-        ct = ContentType.objects.get_for_model(product)
-        return self.filter(content_type=ct, object_id=product.pk)
+        # Local import: services.contenttypes imports the models package
+        from stockman.services.contenttypes import product_key_for
+
+        return self.filter(product_key=product_key_for(product))
     
     def physical(self):
         """Only physical stock (target_date=None or past)."""
@@ -35,6 +38,24 @@ class QuantManager(models.Manager):
         """Only planned production (target_date in future)."""
         return self.filter(target_date__gt=date.today())
     
+    def with_held(self, now=None):
+        """
+        Annotate _held_qty: sum of active, non-expired holds per quant.
+
+        Correlated subquery rather than a join + GROUP BY, so the result
+        can still be locked with select_for_update().
+        """
+        from stockman.models.hold import Hold
+
+        held = (
+            Hold.objects.filter(quant=OuterRef('pk'))
+            .active(now)
+            .values('quant')
+            .annotate(t=Sum('quantity'))
+            .values('t')
+        )
+        return self.annotate(_held_qty=Coalesce(Subquery(held), Decimal('0')))
+    
     def at_position(self, position):
         """Filter by position."""
         if position is None:
@@ -42,6 +63,10 @@ class QuantManager(models.Manager):
         return self.filter(position=position)
 
 
+class QuantManager(models.Manager):
+    """Manager for Quant; the query helpers live on QuantQuerySet."""
+
+
 class Quant(models.Model):
     """
     Quantity of a product at a space-time coordinate.
@@ -66,6 +91,8 @@ class Quant(models.Model):
         verbose_name=_('ID do Produto'),
     )
     product = GenericForeignKey('content_type', 'object_id')
+    # content_type_id << 32 | object_id, for single-column product lookups
+    product_key = product_key_field()
     
     # Space-time coordinates
     position = models.ForeignKey(
@@ -111,7 +138,8 @@ class Quant(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('criado em'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('atualizado em'))
     
-    objects = QuantManager()
+    # Helpers on the QuerySet so they chain from any queryset (admin, related)
+    objects = QuantManager.from_queryset(QuantQuerySet)()
     
     class Meta:
         verbose_name = _('Saldo')
@@ -123,7 +151,7 @@ class Quant(models.Model):
             ),
         ]
         indexes = [
-            models.Index(fields=['content_type', 'object_id']),
+            models.Index(fields=['product_key', 'target_date']),
             models.Index(fields=['target_date']),
             models.Index(fields=['position', 'target_date']),
         ]
@@ -144,7 +172,13 @@ class Quant(models.Model):
 
         IMPORTANT: Ignores expired holds even if status is still PENDING/CONFIRMED.
         This ensures availability is always correct, regardless of cron timing.
+
+        Uses the _held_qty annotation when loaded via with_held() (e.g. admin
+        changelists), instead of one aggregate query per row.
         """
+        held = getattr(self, '_held_qty', None)
+        if held is not None:
+            return held
         return self.holds.active().aggregate(
             total=Coalesce(Sum('quantity'), Decimal('0'))
         )['total']
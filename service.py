@@ -9,9 +9,9 @@ Usage:
     stock.available(croissant, friday)  # 45
 
 Implementation is split into modules under stockman/services/:
-    queries.py    — available, demand, committed, get_quant, list_quants
+    queries.py    — available, available_bulk, demand, committed, get_quant, list_quants
     movements.py  — receive, issue, adjust
-    holds.py      — hold, confirm, release, fulfill, release_expired
+    holds.py      — hold, confirm, release, release_many, fulfill, release_expired
     planning.py   — plan, replan, realize
 """
 
@@ -13,17 +13,59 @@ import logging
 from datetime import date
 from decimal import Decimal
 
-from django.db.models import Sum
+from django.db.models import F, OuterRef, Q, Subquery, Sum
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from stockman.models.alert import StockAlert
 from stockman.models.hold import Hold
+from stockman.models.position import Position
+from stockman.models.product_key import product_key_expression
 from stockman.models.quant import Quant
+from stockman.services.contenttypes import ct_for
 
 logger = logging.getLogger('stockman')
 
 
+def _with_available(alerts, today: date, now, by_position: bool):
+    """
+    Annotate alerts with `available` computed in SQL and keep triggered ones.
+
+    on_hand and held are correlated subqueries, so the database does the
+    summing and subtraction for every alert in a single query.
+    """
+    # Correlate on product_key so the Quant/Hold product_key indexes apply
+    quants = Quant.objects.filter(
+        product_key=OuterRef('_product_key'),
+    ).filter(
+        # Physical stock only (no future planned)
+        Q(target_date__isnull=True) | Q(target_date__lte=today)
+    )
+    holds = Hold.objects.filter(
+        product_key=OuterRef('_product_key'),
+        target_date=today,
+    ).active(now)
+    if by_position:
+        quants = quants.filter(position=OuterRef('position'))
+        holds = holds.filter(quant__position=OuterRef('position'))
+
+    total = quants.order_by().values('product_key').annotate(
+        t=Sum('_quantity')
+    ).values('t')
+    held = holds.order_by().values('product_key').annotate(
+        t=Sum('quantity')
+    ).values('t')
+
+    return alerts.annotate(
+        _product_key=product_key_expression(),
+    ).annotate(
+        available=(
+            Coalesce(Subquery(total), Decimal('0'))
+            - Coalesce(Subquery(held), Decimal('0'))
+        ),
+    ).filter(available__lt=F('min_quantity'))
+
+
 def check_alerts(product=None) -> list[tuple[StockAlert, Decimal]]:
     """
     Check all active alerts and return those that are triggered.
@@ -38,48 +80,38 @@ def check_alerts(product=None) -> list[tuple[StockAlert, Decimal]]:
     """
     qs = StockAlert.objects.filter(is_active=True)
     if product is not None:
-        from django.contrib.contenttypes.models import ContentType
-        ct = ContentType.objects.get_for_model(product)
+        ct = ct_for(product)
         qs = qs.filter(content_type=ct, object_id=product.pk)
 
-    triggered = []
     now = timezone.now()
+    today = date.today()
 
-    for alert in qs.select_related('position'):
-        quant_qs = Quant.objects.filter(
-            content_type_id=alert.content_type_id,
-            object_id=alert.object_id,
-        )
-        if alert.position:
-            quant_qs = quant_qs.filter(position=alert.position)
+    # Only the FK id is needed to filter; Position rows are resolved
+    # once, afterwards, for the alerts that actually triggered.
+    alerts = qs.only(
+        'content_type', 'object_id', 'position',
+        'min_quantity', 'last_triggered_at',
+    )
 
-        # Physical stock only (no future planned)
-        from django.db.models import Q
-        quant_qs = quant_qs.filter(
-            Q(target_date__isnull=True) | Q(target_date__lte=date.today())
-        )
-
-        total = quant_qs.aggregate(
-            t=Coalesce(Sum('_quantity'), Decimal('0'))
-        )['t']
-
-        held_qs = Hold.objects.filter(
-            content_type_id=alert.content_type_id,
-            object_id=alert.object_id,
-            target_date=date.today(),
-        ).active()
-        if alert.position:
-            held_qs = held_qs.filter(quant__position=alert.position)
-        held = held_qs.aggregate(
-            t=Coalesce(Sum('quantity'), Decimal('0'))
-        )['t']
+    triggered = []
+    for by_position in (False, True):
+        scoped = alerts.filter(position__isnull=not by_position)
+        for alert in _with_available(scoped, today, now, by_position):
+            alert.last_triggered_at = now
+            triggered.append((alert, alert.available))
 
-        available = total - held
+    if triggered:
+        StockAlert.objects.bulk_update(
+            [alert for alert, _ in triggered], ['last_triggered_at']
+        )
 
-        if available < alert.min_quantity:
-            alert.last_triggered_at = now
-            alert.save(update_fields=['last_triggered_at'])
-            triggered.append((alert, available))
+        positions = Position.objects.in_bulk(
+            {alert.position_id for alert, _ in triggered if alert.position_id}
+        )
+        for alert, available in triggered:
+            position = positions.get(alert.position_id)
+            if position is not None:
+                alert.position = position
             logger.warning(
                 "stock.alert.triggered",
                 extra={
@@ -87,7 +119,7 @@ def check_alerts(product=None) -> list[tuple[StockAlert, Decimal]]:
                     "product_id": alert.object_id,
                     "min_quantity": str(alert.min_quantity),
                     "available": str(available),
-                    "position": str(alert.position) if alert.position else "all",
+                    "position": str(position) if position else "all",
                 },
             )
 
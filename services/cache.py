@@ -0,0 +1,109 @@
+"""
+Short-lived in-process cache for availability reads.
+
+available() and committed() are pure reads of (product, date, position)
+and are hit repeatedly within seconds by cart/checkout flows. With
+STOCKMAN["AVAILABILITY_CACHE_TTL"] > 0, results are kept for that many
+seconds and dropped whenever a service writes stock or holds for the
+product, and again on commit. Each drop bumps the product's generation;
+a read computed across a drop is returned but not stored, so concurrent
+readers can't re-cache the pre-commit value.
+
+Disabled by default (TTL 0): the cache is per process, so other workers
+only see a change once their entry expires.
+
+Reads inside a transaction bypass the cache: they may see uncommitted
+rows, writes that are later rolled back, or an older snapshot, none of
+which may be served to other threads.
+"""
+
+import threading
+import time
+
+from django.db import connection, transaction
+
+from stockman.conf import stockman_settings
+
+# Upper bound on cached products; the whole cache is dropped past it
+MAX_PRODUCTS = 10_000
+
+_lock = threading.Lock()
+_entries: dict[tuple, dict[tuple, tuple[float, object]]] = {}
+# Bumped per product on every drop; _epoch is bumped when all are dropped
+_generations: dict[tuple, int] = {}
+_epoch = 0
+
+
+def _generation(product_key: tuple) -> tuple[int, int]:
+    """Current generation of a product's entries. Call with _lock held."""
+    return _epoch, _generations.get(product_key, 0)
+
+
+def _in_transaction() -> bool:
+    """Inside an atomic block? (TestCase's wrapping blocks don't count.)"""
+    return any(not block._from_testcase for block in connection.atomic_blocks)
+
+
+def cached(key: tuple, ct_id: int, product_pk: int, compute):
+    """
+    Return the cached value for key, or compute and cache it.
+
+    Args:
+        key: Read coordinates, e.g. ('available', target_date, position_pk)
+        ct_id, product_pk: Product the value depends on (invalidation unit)
+        compute: Zero-argument callable producing the value
+    """
+    ttl = stockman_settings.AVAILABILITY_CACHE_TTL
+    if not ttl or _in_transaction():
+        return compute()
+
+    product_key = (ct_id, product_pk)
+    now = time.monotonic()
+    with _lock:
+        hit = _entries.get(product_key, {}).get(key)
+        generation = _generation(product_key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+
+    value = compute()
+    with _lock:
+        if _generation(product_key) != generation:
+            # Invalidated while computing: value may predate the write
+            return value
+        if product_key not in _entries and len(_entries) >= MAX_PRODUCTS:
+            _entries.clear()
+        _entries.setdefault(product_key, {})[key] = (now + ttl, value)
+    return value
+
+
+def _drop(product_key: tuple | None) -> None:
+    global _epoch
+    with _lock:
+        if product_key is None:
+            _entries.clear()
+            _generations.clear()
+            _epoch += 1
+            return
+        _entries.pop(product_key, None)
+        if product_key not in _generations and len(_generations) >= MAX_PRODUCTS:
+            # Bounded like _entries: forget every counter and move the epoch
+            _generations.clear()
+            _epoch += 1
+        _generations[product_key] = _generations.get(product_key, 0) + 1
+
+
+def invalidate(ct_id: int | None = None, product_pk: int | None = None) -> None:
+    """
+    Drop cached reads for a product (or everything, when called without args).
+
+    Call after any write that changes quantities or active holds.
+    """
+    product_key = None if ct_id is None else (ct_id, product_pk)
+    _drop(product_key)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _drop(product_key))
+
+
+def reset_cache() -> None:
+    """Clear the whole cache (for tests)."""
+    _drop(None)
@@ -0,0 +1,43 @@
+"""
+ContentType lookup cache for hot service paths.
+
+Every stock operation resolves the product's ContentType. Django's
+manager already caches rows, but still walks the model meta on each
+call; this keeps a direct class -> ContentType map for the process.
+
+Usage:
+    from stockman.services.contenttypes import ct_for, product_key_for
+
+    ct = ct_for(product)
+    quants = Quant.objects.filter(product_key=product_key_for(product))
+"""
+
+from functools import lru_cache
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_migrate
+
+from stockman.models.product_key import pack_product_key
+
+
+@lru_cache(maxsize=256)
+def _ct_for_model(model_cls) -> ContentType:
+    return ContentType.objects.get_for_model(model_cls)
+
+
+def ct_for(obj) -> ContentType:
+    """Return the ContentType for a model instance (cached per class)."""
+    return _ct_for_model(type(obj))
+
+
+def product_key_for(obj) -> int:
+    """Return the packed product_key of a product instance."""
+    return pack_product_key(ct_for(obj).pk, obj.pk)
+
+
+def reset_ct_cache(**kwargs) -> None:
+    """Clear cached ContentTypes (rows may be recreated by migrate/flush)."""
+    _ct_for_model.cache_clear()
+
+
+post_migrate.connect(reset_ct_cache, dispatch_uid='stockman.reset_ct_cache')
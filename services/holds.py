@@ -5,22 +5,26 @@ All methods use transaction.atomic() with appropriate locking.
 """
 
 import logging
+import re
+from array import array
 from datetime import date
 from decimal import Decimal
 
-from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
-from django.db.models import Q, Sum
-from django.db.models.functions import Coalesce
+from django.db import connection, transaction
+from django.db.models import F, JSONField, Q
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
 
 from stockman.conf import stockman_settings
 from stockman.exceptions import StockError
 from stockman.models.enums import HoldStatus
-from stockman.models.hold import Hold
+from stockman.models.hold import ACTIVE_HOLD_STATUSES, Hold
 from stockman.models.move import Move
 from stockman.models.quant import Quant
-from stockman.shelflife import filter_valid_quants
+from stockman.services.cache import invalidate
+from stockman.services.contenttypes import ct_for, product_key_for
+from stockman.services.locking import for_update
+from stockman.shelflife import valid_quants_q
 
 logger = logging.getLogger('stockman')
 
@@ -39,48 +43,145 @@ def _get_product_attr(product, attr: str, default=None):
     return PRODUCT_DEFAULTS.get(attr, default)
 
 
+# Rows fetched per round trip when streaming expired hold pks
+_ITERATOR_CHUNK_SIZE = 500
+
+# "hold:{pk}" — ASCII digits only (int() alone would accept " 5", "+5", "1_0")
+_HOLD_ID_RE = re.compile(r'hold:([0-9]+)')
+
+
 def _parse_hold_id(hold_id: str) -> int:
     """Extract PK from hold_id."""
-    if hold_id and hold_id.startswith('hold:'):
-        try:
-            return int(hold_id.split(':')[1])
-        except (IndexError, ValueError):
-            pass
-    raise StockError('INVALID_HOLD', hold_id=hold_id)
+    match = _HOLD_ID_RE.fullmatch(hold_id) if isinstance(hold_id, str) else None
+    if match is None:
+        raise StockError('INVALID_HOLD', hold_id=hold_id)
+    return int(match.group(1))
+
+
+def _lock_product(ct, product) -> None:
+    """
+    Serialize hold attempts for one product (PostgreSQL only).
+
+    Takes a transaction-scoped advisory lock keyed by the product, so
+    concurrent holds queue up once instead of contending on whichever
+    candidate quant row the FIFO scan picks. Released on commit/rollback.
+    No-op on other backends, which rely on the quant row lock alone.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))",
+            [f"stockman.hold:{ct.pk}:{product.pk}"],
+        )
+
 
+def _find_quant_for_hold(product, target_date: date, quantity: Decimal) -> int | None:
+    """
+    Lock and return the pk of the first quant (FIFO) with enough availability.
 
-def _find_quant_for_hold(product, target_date: date, quantity: Decimal) -> Quant | None:
-    """Find a quant with enough availability for the hold (FIFO)."""
-    ct = ContentType.objects.get_for_model(product)
+    Availability is computed in the same statement (correlated subquery
+    over active holds) and the row is locked in the same SELECT,
+    so there is a single round trip and no re-check after locking.
+    PostgreSQL rejects FOR UPDATE with GROUP BY, hence a subquery rather
+    than a joined aggregate. Only the pk is fetched; the caller just
+    links the new hold to it. Must be called inside transaction.atomic().
+    """
+    quants = Quant.objects.with_held().filter(
+        Q(product_key=product_key_for(product)) & valid_quants_q(product, target_date)
+    )
 
-    quants = Quant.objects.filter(
-        content_type=ct,
-        object_id=product.pk
+    candidates = (
+        quants.annotate(_available=F('_quantity') - F('_held_qty'))
+        .filter(_available__gte=quantity)
+        .order_by('created_at')
+        .values_list('pk', flat=True)
     )
-    quants = filter_valid_quants(quants, product, target_date)
-
-    # Annotate held_qty to avoid N+1
-    now = timezone.now()
-    quants = quants.annotate(
-        _held_qty=Coalesce(
-            Sum(
-                'holds__quantity',
-                filter=Q(
-                    holds__status__in=[HoldStatus.PENDING, HoldStatus.CONFIRMED],
-                ) & (
-                    Q(holds__expires_at__isnull=True) | Q(holds__expires_at__gte=now)
-                ),
-            ),
-            Decimal('0'),
+    return for_update(candidates).first()
+
+
+def _release_expired_batch(now, batch_size: int) -> int:
+    """
+    Release up to batch_size expired holds; return how many were released.
+
+    On PostgreSQL the row locking (SKIP LOCKED) and the UPDATE run as a
+    single statement. Elsewhere, falls back to SELECT then UPDATE.
+    Must be called inside transaction.atomic().
+    """
+    if connection.vendor == 'postgresql':
+        table = Hold._meta.db_table
+        pk = Hold._meta.pk.column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET status = %s, resolved_at = %s
+                WHERE {pk} IN (
+                    SELECT {pk} FROM {table}
+                    WHERE status = ANY(%s) AND expires_at < %s
+                    LIMIT %s
+                    FOR NO KEY UPDATE SKIP LOCKED
+                )
+                """,
+                [
+                    HoldStatus.RELEASED.value, now,
+                    [status.value for status in ACTIVE_HOLD_STATUSES], now,
+                    batch_size,
+                ],
+            )
+            return cursor.rowcount
+
+    # Stream the locked pks into a compact int64 array rather than a list
+    batch_ids = array('q', (
+        for_update(Hold.objects, skip_locked=True)
+        .expired(now)
+        .values_list('pk', flat=True)[:batch_size]
+        .iterator(chunk_size=min(batch_size, _ITERATOR_CHUNK_SIZE))
+    ))
+    if not batch_ids:
+        return 0
+    return Hold.objects.filter(pk__in=batch_ids).update(
+        status=HoldStatus.RELEASED,
+        resolved_at=now,
+    )
+
+
+def _release_changes(reason: str) -> dict:
+    """
+    UPDATE values releasing a hold, recording reason in its metadata.
+
+    On PostgreSQL the reason is set server-side with jsonb_set instead of
+    rewriting the whole document. Elsewhere there is no 'metadata' entry
+    and the caller writes it back after the UPDATE.
+    """
+    changes = {'status': HoldStatus.RELEASED, 'resolved_at': timezone.now()}
+    if connection.vendor == 'postgresql':
+        changes['metadata'] = RawSQL(
+            "jsonb_set(metadata, '{release_reason}', to_jsonb(%s::text))",
+            [reason],
+            output_field=JSONField(),
         )
-    ).order_by('created_at')
+    return changes
+
+
+def _transition(hold_id, pk: int, from_statuses, expected, **changes) -> None:
+    """
+    Move a hold out of from_statuses with one conditional UPDATE.
 
-    for quant in quants:
-        available = quant._quantity - quant._held_qty
-        if available >= quantity:
-            return quant
+    The status check is the UPDATE's WHERE clause, so there is no
+    SELECT FOR UPDATE beforehand. The hold's status is only read back
+    on the error path, to report it.
 
-    return None
+    Raises:
+        StockError('INVALID_HOLD'): If the hold does not exist
+        StockError('INVALID_STATUS'): If the hold is not in from_statuses
+    """
+    if Hold.objects.filter(pk=pk, status__in=from_statuses).update(**changes):
+        return
+
+    current = Hold.objects.filter(pk=pk).values_list('status', flat=True).first()
+    if current is None:
+        raise StockError('INVALID_HOLD', hold_id=hold_id)
+    raise StockError('INVALID_STATUS', current=current, expected=expected)
 
 
 class StockHolds:
@@ -103,53 +204,54 @@ class StockHolds:
         Raises:
             StockError('INSUFFICIENT_AVAILABLE'): If no availability
                 and policy is not 'demand_ok'
+
+        Concurrency:
+            - Runs under transaction.atomic()
+            - PostgreSQL: per-product advisory lock serializes holds
+            - The chosen Quant is row-locked, guarding against
+              concurrent issue()/adjust() on the same row
         """
         if quantity <= 0:
             raise StockError('INVALID_QUANTITY', requested=quantity)
 
         target = target_date or date.today()
         policy = _get_product_attr(product, 'availability_policy', 'planned_ok')
-        ct = ContentType.objects.get_for_model(product)
+        ct = ct_for(product)
 
         purpose_type = None
         purpose_id = None
         if purpose is not None:
-            purpose_type = ContentType.objects.get_for_model(purpose)
+            purpose_type = ct_for(purpose)
             purpose_id = purpose.pk
 
         with transaction.atomic():
-            quant = _find_quant_for_hold(product, target, quantity)
-
-            if quant:
-                quant = Quant.objects.select_for_update().get(pk=quant.pk)
-
-                if quant.available >= quantity:
-                    hold = Hold.objects.create(
-                        content_type=ct,
-                        object_id=product.pk,
-                        quant=quant,
-                        quantity=quantity,
-                        target_date=target,
-                        status=HoldStatus.PENDING,
-                        purpose_type=purpose_type,
-                        purpose_id=purpose_id,
-                        expires_at=expires_at,
-                        metadata=metadata
-                    )
-                    logger.info(
-                        "stock.hold.created",
-                        extra={
-                            "product": str(product),
-                            "qty": str(quantity),
-                            "target": str(target),
-                            "hold_id": hold.hold_id,
-                        },
-                    )
-                    return hold.hold_id
+            _lock_product(ct, product)
+            quant_id = _find_quant_for_hold(product, target, quantity)
 
-            # Not enough availability — compute actual total for error reporting
-            from stockman.services.queries import StockQueries
-            current_available = StockQueries.available(product, target)
+            if quant_id is not None:
+                hold = Hold.objects.create(
+                    content_type=ct,
+                    object_id=product.pk,
+                    quant_id=quant_id,
+                    quantity=quantity,
+                    target_date=target,
+                    status=HoldStatus.PENDING,
+                    purpose_type=purpose_type,
+                    purpose_id=purpose_id,
+                    expires_at=expires_at,
+                    metadata=metadata
+                )
+                invalidate(ct.pk, product.pk)
+                logger.info(
+                    "stock.hold.created",
+                    extra={
+                        "product": str(product),
+                        "qty": str(quantity),
+                        "target": str(target),
+                        "hold_id": hold.hold_id,
+                    },
+                )
+                return hold.hold_id
 
             if policy == 'demand_ok':
                 hold = Hold.objects.create(
@@ -164,6 +266,7 @@ class StockHolds:
                     expires_at=expires_at,
                     metadata=metadata
                 )
+                invalidate(ct.pk, product.pk)
                 logger.info(
                     "stock.hold.demand",
                     extra={
@@ -175,6 +278,10 @@ class StockHolds:
                 )
                 return hold.hold_id
 
+            # Not enough availability — compute actual total for error reporting
+            from stockman.services.queries import StockQueries
+            current_available = StockQueries.available(product, target)
+
             raise StockError(
                 'INSUFFICIENT_AVAILABLE',
                 available=current_available,
@@ -190,26 +297,15 @@ class StockHolds:
         """
         pk = _parse_hold_id(hold_id)
 
-        with transaction.atomic():
-            try:
-                hold = Hold.objects.select_for_update().get(pk=pk)
-            except Hold.DoesNotExist:
-                raise StockError('INVALID_HOLD', hold_id=hold_id) from None
-
-            if hold.status != HoldStatus.PENDING:
-                raise StockError(
-                    'INVALID_STATUS',
-                    current=hold.status,
-                    expected=HoldStatus.PENDING
-                )
-
-            hold.status = HoldStatus.CONFIRMED
-            hold.save(update_fields=['status'])
-            logger.info(
-                "stock.hold.confirmed",
-                extra={"hold_id": hold_id},
-            )
-            return hold
+        _transition(
+            hold_id, pk, [HoldStatus.PENDING], HoldStatus.PENDING,
+            status=HoldStatus.CONFIRMED,
+        )
+        logger.info(
+            "stock.hold.confirmed",
+            extra={"hold_id": hold_id},
+        )
+        return Hold.objects.get(pk=pk)
 
     @classmethod
     def release(cls, hold_id, reason='Liberado'):
@@ -219,30 +315,74 @@ class StockHolds:
         Transition: PENDING|CONFIRMED -> RELEASED
         """
         pk = _parse_hold_id(hold_id)
+        changes = _release_changes(reason)
 
         with transaction.atomic():
-            try:
-                hold = Hold.objects.select_for_update().get(pk=pk)
-            except Hold.DoesNotExist:
-                raise StockError('INVALID_HOLD', hold_id=hold_id) from None
-
-            if hold.status not in [HoldStatus.PENDING, HoldStatus.CONFIRMED]:
-                raise StockError(
-                    'INVALID_STATUS',
-                    current=hold.status,
-                    expected=[HoldStatus.PENDING, HoldStatus.CONFIRMED]
-                )
+            _transition(
+                hold_id, pk, ACTIVE_HOLD_STATUSES, list(ACTIVE_HOLD_STATUSES),
+                **changes,
+            )
+
+            # Row is locked by the UPDATE above until commit
+            hold = Hold.objects.get(pk=pk)
+            if 'metadata' not in changes:
+                hold.metadata['release_reason'] = reason
+                hold.save(update_fields=['metadata'])
 
-            hold.status = HoldStatus.RELEASED
-            hold.resolved_at = timezone.now()
-            hold.metadata['release_reason'] = reason
-            hold.save(update_fields=['status', 'resolved_at', 'metadata'])
+            invalidate(hold.content_type_id, hold.object_id)
             logger.info(
                 "stock.hold.released",
                 extra={"hold_id": hold_id, "reason": reason},
             )
             return hold
 
+    @classmethod
+    def release_many(cls, hold_ids, reason='Liberado'):
+        """
+        Release several holds at once (e.g. a cancelled order).
+
+        Transition: PENDING|CONFIRMED -> RELEASED with one UPDATE for all.
+        Unlike release(), holds that are no longer active are skipped
+        rather than raising.
+
+        Returns:
+            Number of holds released
+
+        Raises:
+            StockError('INVALID_HOLD'): If any hold_id is malformed
+                (checked before anything is written)
+        """
+        pks = [_parse_hold_id(hold_id) for hold_id in hold_ids]
+        if not pks:
+            return 0
+
+        changes = _release_changes(reason)
+
+        with transaction.atomic():
+            locked = for_update(
+                Hold.objects.filter(pk__in=pks, status__in=ACTIVE_HOLD_STATUSES)
+            ).values_list('pk', 'content_type_id', 'object_id')
+            rows = list(locked)
+            if not rows:
+                return 0
+
+            released = Hold.objects.filter(pk__in=[row[0] for row in rows])
+            count = released.update(**changes)
+
+            if 'metadata' not in changes:
+                holds = list(released.only('pk', 'metadata'))
+                for hold in holds:
+                    hold.metadata['release_reason'] = reason
+                Hold.objects.bulk_update(holds, ['metadata'])
+
+            for ct_id, object_id in {row[1:] for row in rows}:
+                invalidate(ct_id, object_id)
+            logger.info(
+                "stock.holds.released",
+                extra={"released": count, "reason": reason},
+            )
+            return count
+
     @classmethod
     def fulfill(cls, hold_id, reference=None, user=None):
         """
@@ -258,35 +398,29 @@ class StockHolds:
         pk = _parse_hold_id(hold_id)
 
         with transaction.atomic():
-            try:
-                hold = Hold.objects.select_for_update().get(pk=pk)
-            except Hold.DoesNotExist:
-                raise StockError('INVALID_HOLD', hold_id=hold_id) from None
-
-            if hold.status != HoldStatus.CONFIRMED:
-                raise StockError(
-                    'INVALID_STATUS',
-                    current=hold.status,
-                    expected=HoldStatus.CONFIRMED
-                )
+            _transition(
+                hold_id, pk, [HoldStatus.CONFIRMED], HoldStatus.CONFIRMED,
+                status=HoldStatus.FULFILLED,
+                resolved_at=timezone.now(),
+            )
 
-            if hold.quant is None:
+            # Row is locked by the UPDATE above; raising rolls it back
+            hold = Hold.objects.get(pk=pk)
+            if hold.quant_id is None:
                 raise StockError('HOLD_IS_DEMAND', hold_id=hold_id)
 
-            quant = Quant.objects.select_for_update().get(pk=hold.quant_id)
-
+            # No Quant lock: the hold already reserved this quantity, so the
+            # exit leaves quant.available unchanged, and Move.save() applies
+            # the delta with an atomic F() update.
             move = Move.objects.create(
-                quant=quant,
+                quant_id=hold.quant_id,
                 delta=-hold.quantity,
                 reference=reference,
                 reason=f"Entrega hold:{hold.pk}",
                 user=user
             )
 
-            hold.status = HoldStatus.FULFILLED
-            hold.resolved_at = timezone.now()
-            hold.save(update_fields=['status', 'resolved_at'])
-
+            invalidate(hold.content_type_id, hold.object_id)
             logger.info(
                 "stock.hold.fulfilled",
                 extra={"hold_id": hold_id, "qty": str(hold.quantity)},
@@ -303,7 +437,8 @@ class StockHolds:
 
         Concurrency:
             - Each batch runs under its own transaction.atomic()
-            - Uses select_for_update() with SKIP LOCKED
+            - Locks candidates with FOR NO KEY UPDATE SKIP LOCKED
+            - PostgreSQL: lock + update in a single statement per batch
             - Safe for multiple instances
         """
         now = timezone.now()
@@ -312,22 +447,16 @@ class StockHolds:
 
         while True:
             with transaction.atomic():
-                batch_ids = list(
-                    Hold.objects.select_for_update(skip_locked=True)
-                    .expired()
-                    .values_list('pk', flat=True)[:batch_size]
-                )
-
-                if not batch_ids:
-                    break
+                released = _release_expired_batch(now, batch_size)
 
-                Hold.objects.filter(pk__in=batch_ids).update(
-                    status=HoldStatus.RELEASED,
-                    resolved_at=now,
-                )
-                total += len(batch_ids)
+            if not released:
+                break
+            total += released
 
         if total:
+            # Bulk release spans products; drop the whole read cache.
+            invalidate()
+
             logger.info(
                 "stock.holds.expired_released",
                 extra={"released": total},
@@ -0,0 +1,51 @@
+"""
+Isolation level for read-only stock queries.
+
+Projects running PostgreSQL at SERIALIZABLE pay predicate-locking
+overhead (and risk serialization failures) even for pure reads. With
+STOCKMAN["QUERY_ISOLATION_LEVEL"] set, StockQueries reads that start
+outside a transaction run in their own short transaction at that level.
+The write paths re-validate under row locks, so a READ COMMITTED
+snapshot is enough for them.
+
+Reads inside an existing transaction keep its level: PostgreSQL only
+allows SET TRANSACTION before the first query.
+"""
+
+from functools import wraps
+
+from django.db import connection, transaction
+
+from stockman.conf import stockman_settings
+
+ISOLATION_LEVELS = ('READ COMMITTED', 'REPEATABLE READ')
+
+
+def _isolation_level() -> str | None:
+    setting = stockman_settings.QUERY_ISOLATION_LEVEL
+    if not setting:
+        return None
+    # Validated before the backend checks so a typo fails on every backend
+    level = setting.upper()
+    if level not in ISOLATION_LEVELS:
+        raise ValueError(
+            f"STOCKMAN['QUERY_ISOLATION_LEVEL'] must be one of {ISOLATION_LEVELS}, "
+            f"got {setting!r}"
+        )
+    if connection.vendor != 'postgresql' or connection.in_atomic_block:
+        return None
+    return level
+
+
+def read_isolated(func):
+    """Run func at QUERY_ISOLATION_LEVEL when called outside a transaction."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        level = _isolation_level()
+        if level is None:
+            return func(*args, **kwargs)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {level}")
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,21 @@
+"""
+Row locking helpers for state-changing services.
+
+Stock services lock Quant/Hold rows to update quantities and statuses,
+never their primary keys. On PostgreSQL this only needs FOR NO KEY
+UPDATE, which (unlike FOR UPDATE) does not block the KEY SHARE locks
+taken by inserts of referencing rows — e.g. Moves or Holds created
+against the same Quant by other transactions.
+"""
+
+from django.db import connection
+
+
+def for_update(queryset, **kwargs):
+    """
+    select_for_update() using NO KEY UPDATE where the backend supports it.
+
+    Accepts the same keyword arguments as QuerySet.select_for_update().
+    """
+    no_key = connection.features.has_select_for_no_key_update
+    return queryset.select_for_update(no_key=no_key, **kwargs)
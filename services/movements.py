@@ -11,6 +11,9 @@ from django.db import transaction
 from stockman.exceptions import StockError
 from stockman.models.move import Move
 from stockman.models.quant import Quant
+from stockman.services.cache import invalidate
+from stockman.services.contenttypes import ct_for
+from stockman.services.locking import for_update
 
 logger = logging.getLogger('stockman')
 
@@ -36,14 +39,18 @@ class StockMovements:
 
         Concurrency:
             - Runs under transaction.atomic()
-            - Uses get_or_create with defaults
-            - Move.save() updates _quantity atomically
+            - Uses get_or_create with defaults: one SELECT when the quant
+              exists. Not INSERT ... ON CONFLICT: position and target_date
+              are nullable, and NULLs never conflict under
+              unique_quant_coordinate, so physical quants would not match
+            - Move.save() updates _quantity atomically via F()
+            - No refresh_from_db(): new quants are updated locally,
+              existing ones re-read only _quantity
         """
         if quantity <= 0:
             raise StockError('INVALID_QUANTITY', requested=quantity)
 
-        from django.contrib.contenttypes.models import ContentType
-        ct = ContentType.objects.get_for_model(product)
+        ct = ct_for(product)
 
         with transaction.atomic():
             quant, created = Quant.objects.get_or_create(
@@ -64,7 +71,18 @@ class StockMovements:
                 metadata=metadata
             )
 
-            quant.refresh_from_db()
+            # Move.save() already applied F('_quantity') + delta in the DB.
+            # A quant created here is invisible to other transactions, so
+            # the local sum is exact. An existing one may have been moved
+            # concurrently since get_or_create(): read back only _quantity
+            # instead of a full refresh_from_db().
+            if created:
+                quant._quantity += quantity
+            else:
+                quant._quantity = Quant.objects.filter(pk=quant.pk).values_list(
+                    '_quantity', flat=True
+                ).get()
+            invalidate(ct.pk, product.pk)
             logger.info(
                 "stock.receive",
                 extra={
@@ -89,19 +107,22 @@ class StockMovements:
 
         Concurrency:
             - Runs under transaction.atomic()
-            - Uses select_for_update() on Quant
+            - Locks the Quant row (NO KEY UPDATE on PostgreSQL)
             - Verifies availability after lock
         """
         if quantity <= 0:
             raise StockError('INVALID_QUANTITY', requested=quantity)
 
         with transaction.atomic():
-            locked_quant = Quant.objects.select_for_update().get(pk=quant.pk)
+            # Held sum comes with the locked row: one query instead of
+            # two extra aggregates through Quant.available
+            locked_quant = for_update(Quant.objects.with_held()).get(pk=quant.pk)
+            available = locked_quant._quantity - locked_quant._held_qty
 
-            if locked_quant.available < quantity:
+            if available < quantity:
                 raise StockError(
                     'INSUFFICIENT_QUANTITY',
-                    available=locked_quant.available,
+                    available=available,
                     requested=quantity
                 )
 
@@ -112,6 +133,7 @@ class StockMovements:
                 reason=reason,
                 user=user
             )
+            invalidate(locked_quant.content_type_id, locked_quant.object_id)
             logger.info(
                 "stock.issue",
                 extra={
@@ -136,7 +158,7 @@ class StockMovements:
             raise StockError('REASON_REQUIRED')
 
         with transaction.atomic():
-            locked_quant = Quant.objects.select_for_update().get(pk=quant.pk)
+            locked_quant = for_update(Quant.objects).get(pk=quant.pk)
             delta = new_quantity - locked_quant._quantity
 
             if delta == 0:
@@ -148,6 +170,7 @@ class StockMovements:
                 reason=f"Ajuste: {reason}",
                 user=user
             )
+            invalidate(locked_quant.content_type_id, locked_quant.object_id)
             logger.info(
                 "stock.adjust",
                 extra={
@@ -6,13 +6,15 @@ Extension that builds on top of movements for production scheduling.
 
 import logging
 
-from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
 
 from stockman.exceptions import StockError
-from stockman.models.enums import HoldStatus
+from stockman.models.hold import ACTIVE_HOLD_STATUSES
 from stockman.models.move import Move
 from stockman.models.quant import Quant
+from stockman.services.cache import invalidate
+from stockman.services.contenttypes import ct_for
+from stockman.services.locking import for_update
 
 logger = logging.getLogger('stockman')
 
@@ -61,7 +63,8 @@ class StockPlanning:
             raise StockError('QUANT_NOT_FOUND', product=str(product), target_date=target_date)
 
         StockMovements.adjust(quant, quantity, reason, user)
-        quant.refresh_from_db()
+        # adjust() only moved the quantity cache
+        quant.refresh_from_db(fields=['_quantity', 'updated_at'])
         return quant
 
     @classmethod
@@ -86,20 +89,10 @@ class StockPlanning:
         if quant is None:
             raise StockError('QUANT_NOT_FOUND', product=str(product), target_date=target_date)
 
-        ct = ContentType.objects.get_for_model(product)
+        ct = ct_for(product)
 
         with transaction.atomic():
-            locked_quant = Quant.objects.select_for_update().get(pk=quant.pk)
-
-            # Adjust if different
-            if locked_quant._quantity != actual_quantity:
-                delta = actual_quantity - locked_quant._quantity
-                Move.objects.create(
-                    quant=locked_quant,
-                    delta=delta,
-                    reason=f"Ajuste produção: {reason}",
-                    user=user
-                )
+            locked_quant = for_update(Quant.objects).get(pk=quant.pk)
 
             # Get or create physical quant
             physical_quant, _ = Quant.objects.get_or_create(
@@ -111,27 +104,42 @@ class StockPlanning:
                 defaults={'metadata': {}}
             )
 
+            moves = []
+
+            # Adjust if different
+            if locked_quant._quantity != actual_quantity:
+                delta = actual_quantity - locked_quant._quantity
+                moves.append(Move(
+                    quant=locked_quant,
+                    delta=delta,
+                    reason=f"Ajuste produção: {reason}",
+                    user=user
+                ))
+
             # Transfer: exit from planned, enter physical
-            Move.objects.create(
+            moves.append(Move(
                 quant=locked_quant,
                 delta=-actual_quantity,
                 reason=f"Transferência: {reason}",
                 user=user
-            )
-
-            Move.objects.create(
+            ))
+            moves.append(Move(
                 quant=physical_quant,
                 delta=actual_quantity,
                 reason=f"Recebido de produção: {reason}",
                 user=user
-            )
+            ))
+
+            # One INSERT for the moves, one UPDATE for both quant caches
+            Move.objects.bulk_create(moves)
 
             # Transfer holds
             locked_quant.holds.filter(
-                status__in=[HoldStatus.PENDING, HoldStatus.CONFIRMED]
+                status__in=ACTIVE_HOLD_STATUSES
             ).update(quant=physical_quant)
 
-            physical_quant.refresh_from_db()
+            physical_quant.refresh_from_db(fields=['_quantity', 'updated_at'])
+            invalidate(ct.pk, product.pk)
             logger.info(
                 "stock.realize",
                 extra={
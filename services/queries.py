@@ -2,19 +2,70 @@
 Stock queries — read-only operations.
 
 All methods are classmethod on Stock and use no locking.
+available() and committed() go through the opt-in read cache
+(see stockman.services.cache). Queries can run at a lower isolation
+level than the connection's (see stockman.services.isolation).
 """
 
+from collections import defaultdict
 from datetime import date
 from decimal import Decimal
 
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q, Sum
+from django.db.models import Q, Subquery, Sum
 from django.db.models.functions import Coalesce
 
-from stockman.models.hold import Hold
+from stockman.models.hold import Hold, active_q
 from stockman.models.position import Position
 from stockman.models.quant import Quant
-from stockman.shelflife import filter_valid_quants
+from stockman.services.cache import cached
+from stockman.services.contenttypes import ct_for, product_key_for
+from stockman.services.isolation import read_isolated
+from stockman.shelflife import valid_quants_q
+
+
+def _quant_q(product, target: date, position: Position | None) -> Q:
+    """Full Quant predicate for available(), applied with a single filter()."""
+    q = Q(product_key=product_key_for(product)) & valid_quants_q(product, target)
+    if position:
+        q &= Q(position=position)
+    return q
+
+
+def _hold_q(product, target: date, position: Position | None) -> Q:
+    """Full Hold predicate for available(), applied with a single filter()."""
+    q = Q(product_key=product_key_for(product), target_date=target) & active_q()
+    if position:
+        q &= Q(quant__position=position)
+    return q
+
+
+@read_isolated
+def _available(product, target: date, position: Position | None) -> Decimal:
+    """Uncached body of StockQueries.available()."""
+    held_qs = Hold.objects.filter(_hold_q(product, target, position))
+    held = held_qs.order_by().values('product_key').annotate(
+        t=Sum('quantity')
+    ).values('t')
+
+    # Held sum as a scalar subquery of the Quant aggregate — one round
+    # trip; an aggregate without GROUP BY yields a row even with no quants.
+    return Quant.objects.filter(_quant_q(product, target, position)).aggregate(
+        available=(
+            Coalesce(Sum('_quantity'), Decimal('0'))
+            - Coalesce(Subquery(held), Decimal('0'))
+        ),
+    )['available']
+
+
+@read_isolated
+def _committed(product, target: date) -> Decimal:
+    """Uncached body of StockQueries.committed()."""
+    return Hold.objects.filter(
+        product_key=product_key_for(product),
+        target_date=target,
+    ).active().aggregate(
+        t=Coalesce(Sum('quantity'), Decimal('0'))
+    )['t']
 
 
 class StockQueries:
@@ -37,32 +88,75 @@ class StockQueries:
             Decimal with available quantity
         """
         target = target_date or date.today()
-        ct = ContentType.objects.get_for_model(product)
-        quants = Quant.objects.filter(content_type=ct, object_id=product.pk)
+        ct = ct_for(product)
+        return cached(
+            ('available', target, position.pk if position else None),
+            ct.pk, product.pk,
+            lambda: _available(product, target, position),
+        )
 
-        if position:
-            quants = quants.filter(position=position)
+    @classmethod
+    @read_isolated
+    def available_bulk(cls, products, target_date: date | None = None,
+                       position: Position | None = None) -> dict[int, Decimal]:
+        """
+        Available quantity for many products at once.
 
-        quants = filter_valid_quants(quants, product, target)
+        Same semantics as available(), in two queries total (one grouped
+        sum over Quants, one over Holds) instead of two per product.
+        Meant for catalog listings.
 
-        total = quants.aggregate(
-            t=Coalesce(Sum('_quantity'), Decimal('0'))
-        )['t']
+        Args:
+            products: Iterable of product objects (results are keyed by pk)
+            target_date: Desired date (None = today)
+            position: Specific position (None = all)
+
+        Returns:
+            Dict {product.pk: available quantity}; products without stock map to 0
+        """
+        products = list(products)
+        if not products:
+            return {}
 
+        target = target_date or date.today()
+
+        # Products sharing a shelflife share a validity window
+        keys = {product.pk: product_key_for(product) for product in products}
+        by_window: dict[int | None, list] = defaultdict(list)
+        for product in products:
+            by_window[getattr(product, 'shelflife', None)].append(product)
+
+        quant_q = Q()
+        for group in by_window.values():
+            quant_q |= Q(
+                product_key__in=[keys[p.pk] for p in group],
+            ) & valid_quants_q(group[0], target)
+
+        quants = Quant.objects.filter(quant_q)
         held_qs = Hold.objects.filter(
-            content_type=ct,
-            object_id=product.pk,
-            target_date=target,
+            product_key__in=keys.values(), target_date=target,
         ).active()
         if position:
+            quants = quants.filter(position=position)
             held_qs = held_qs.filter(quant__position=position)
-        held = held_qs.aggregate(
-            t=Coalesce(Sum('quantity'), Decimal('0'))
-        )['t']
 
-        return total - held
+        totals = dict(
+            quants.order_by().values_list('product_key')
+            .annotate(t=Sum('_quantity'))
+        )
+        held = dict(
+            held_qs.order_by().values_list('product_key')
+            .annotate(t=Sum('quantity'))
+        )
+
+        zero = Decimal('0')
+        return {
+            pk: totals.get(key, zero) - held.get(key, zero)
+            for pk, key in keys.items()
+        }
 
     @classmethod
+    @read_isolated
     def demand(cls, product, target_date: date) -> Decimal:
         """
         Pending demand (holds without linked stock).
@@ -70,10 +164,8 @@ class StockQueries:
         Returns:
             Sum of Hold.quantity where quant=None and target_date=date
         """
-        ct = ContentType.objects.get_for_model(product)
         return Hold.objects.filter(
-            content_type=ct,
-            object_id=product.pk,
+            product_key=product_key_for(product),
             target_date=target_date,
             quant__isnull=True,
         ).active().aggregate(
@@ -93,24 +185,21 @@ class StockQueries:
             Sum of active hold quantities
         """
         target = target_date or date.today()
-        ct = ContentType.objects.get_for_model(product)
+        ct = ct_for(product)
 
-        return Hold.objects.filter(
-            content_type=ct,
-            object_id=product.pk,
-            target_date=target,
-        ).active().aggregate(
-            t=Coalesce(Sum('quantity'), Decimal('0'))
-        )['t']
+        return cached(
+            ('committed', target),
+            ct.pk, product.pk,
+            lambda: _committed(product, target),
+        )
 
     @classmethod
+    @read_isolated
     def get_quant(cls, product, position: Position | None = None,
                   target_date: date | None = None, batch: str = '') -> Quant | None:
         """Get specific quant by coordinates."""
-        ct = ContentType.objects.get_for_model(product)
         return Quant.objects.filter(
-            content_type=ct,
-            object_id=product.pk,
+            product_key=product_key_for(product),
             position=position,
             target_date=target_date,
             batch=batch
@@ -123,8 +212,7 @@ class StockQueries:
         qs = Quant.objects.all()
 
         if product is not None:
-            ct = ContentType.objects.get_for_model(product)
-            qs = qs.filter(content_type=ct, object_id=product.pk)
+            qs = qs.filter(product_key=product_key_for(product))
 
         if position is not None:
             qs = qs.filter(position=position)
@@ -10,9 +10,12 @@ Examples:
     - Wine (shelflife=None): no expiration
 """
 
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
+from django.conf import settings
 from django.db.models import Q
+from django.utils import timezone
 
 
 def is_valid_for_date(quant, product, target_date: date) -> bool:
@@ -45,6 +48,39 @@ def is_valid_for_date(quant, product, target_date: date) -> bool:
     return min_production <= quant.target_date <= target_date
 
 
+def _start_of_day(day: date, tz) -> datetime:
+    """
+    First instant of a day in the given timezone (naive if tz is None).
+
+    Comparing created_at against this bound is equivalent to
+    created_at__date__gte=day, but keeps the column bare so the
+    database can use an index range scan instead of DATE(created_at).
+    """
+    start = datetime.combine(day, time.min)
+    if tz is not None:
+        return timezone.make_aware(start, tz)
+    return start
+
+
+@lru_cache(maxsize=1024)
+def _shelflife_q(shelflife: int | None, target_date: date, tz) -> Q:
+    """
+    Validity window Q for (shelflife, target_date), memoized per process.
+
+    The timezone is part of the key because the created_at bound depends
+    on the active timezone. Callers must not mutate the returned Q;
+    QuerySet.filter() wraps it, so passing it there is safe.
+    """
+    if shelflife is not None:
+        min_production = target_date - timedelta(days=shelflife)
+        return (
+            Q(target_date__isnull=True, created_at__gte=_start_of_day(min_production, tz))
+            | Q(target_date__gte=min_production, target_date__lte=target_date)
+        )
+
+    return Q(target_date__isnull=True) | Q(target_date__lte=target_date)
+
+
 def filter_valid_quants(quants, product, target_date: date):
     """
     Filter a Quant queryset to only include quants valid for the target date.
@@ -60,15 +96,16 @@ def filter_valid_quants(quants, product, target_date: date):
     Returns:
         Filtered QuerySet
     """
-    shelflife = getattr(product, 'shelflife', None)
+    return quants.filter(valid_quants_q(product, target_date))
 
-    if shelflife is not None:
-        min_production = target_date - timedelta(days=shelflife)
-        return quants.filter(
-            Q(target_date__isnull=True, created_at__date__gte=min_production)
-            | Q(target_date__gte=min_production, target_date__lte=target_date)
-        )
 
-    return quants.filter(
-        Q(target_date__isnull=True) | Q(target_date__lte=target_date)
-    )
+def valid_quants_q(product, target_date: date) -> Q:
+    """
+    Q selecting Quants valid for the target date, for this product's shelflife.
+
+    Building block of filter_valid_quants, for callers that combine
+    several products' windows into a single query.
+    """
+    shelflife = getattr(product, 'shelflife', None)
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    return _shelflife_q(shelflife, target_date, tz)
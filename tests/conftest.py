@@ -6,7 +6,11 @@ from datetime import date, timedelta
 from decimal import Decimal
 
 import pytest
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.utils import timezone
 
 from offerman.models import Product, Collection
 from stockman.models import Position, PositionKind
@@ -15,111 +19,187 @@ from stockman.models import Position, PositionKind
 User = get_user_model()
 
 
-@pytest.fixture
-def user(db):
-    """Create a test user."""
-    return User.objects.create_user(
-        username='testuser',
-        password='testpass123'
-    )
-
-
-@pytest.fixture
-def category(db):
-    """Create a test collection."""
-    return Collection.objects.create(
-        name='Paes',
-        slug='paes',
-        is_active=True,
+@pytest.fixture(scope='session', autouse=True)
+def sqlite_pragmas(django_db_setup, django_db_blocker):
+    """
+    Skip fsync and on-disk journaling on a SQLite test database.
+
+    Test data is thrown away, so durability buys nothing here. No-op on
+    other backends, and on SQLite's default in-memory test database
+    these only confirm what it already does.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with django_db_blocker.unblock(), connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=MEMORY')
+        cursor.execute('PRAGMA synchronous=OFF')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def content_types(django_db_setup, django_db_blocker):
+    """Load every model's ContentType in one query into Django's CT cache."""
+    with django_db_blocker.unblock():
+        return ContentType.objects.get_for_models(*apps.get_models())
+
+
+@pytest.fixture(scope='session')
+def product_ct(content_types):
+    """ContentType of the test Product model (shared by all product fixtures)."""
+    return content_types[Product]
+
+
+@pytest.fixture(scope='session')
+def user(django_db_setup, django_db_blocker):
+    """Get or create a test user once per session (unusable password: no PBKDF2)."""
+    with django_db_blocker.unblock():
+        user = User.objects.filter(username='testuser').first()
+        if user is None:
+            user = User(username='testuser')
+            user.set_unusable_password()
+            user.save()
+    return user
+
+
+@pytest.fixture(scope='session')
+def category(django_db_setup, django_db_blocker):
+    """Get or create the test collection once per session."""
+    with django_db_blocker.unblock():
+        collection, _ = Collection.objects.get_or_create(
+            slug='paes',
+            defaults={'name': 'Paes', 'is_active': True},
+        )
+    return collection
+
+
+# Defaults shared by the test products; each fixture overrides what differs
+PRODUCT_DEFAULTS = {
+    'unit': 'un',
+    'is_available': True,
+    'availability_policy': 'planned_ok',
+}
+
+
+def _get_or_create_product(sku, **fields):
+    """Get or create a Product by SKU, on top of PRODUCT_DEFAULTS."""
+    product, _ = Product.objects.get_or_create(
+        sku=sku, defaults={**PRODUCT_DEFAULTS, **fields},
     )
+    return product
+
+
+@pytest.fixture(scope='session')
+def product(django_db_setup, django_db_blocker):
+    """Get or create a test product (non-perishable) once per session."""
+    with django_db_blocker.unblock():
+        return _get_or_create_product(
+            'PAO-FORMA',
+            name='Pao de Forma',
+            base_price_q=1000,  # R$ 10.00
+            shelflife=None,  # Non-perishable
+        )
+
+
+@pytest.fixture(scope='session')
+def perishable_product(django_db_setup, django_db_blocker):
+    """Get or create a perishable product (shelflife=0, same day only) once per session."""
+    with django_db_blocker.unblock():
+        return _get_or_create_product(
+            'CROISSANT',
+            name='Croissant',
+            base_price_q=800,  # R$ 8.00
+            shelflife=0,  # Same day only
+        )
+
+
+@pytest.fixture(scope='session')
+def demand_product(django_db_setup, django_db_blocker):
+    """Get or create a product that accepts demand once per session."""
+    with django_db_blocker.unblock():
+        return _get_or_create_product(
+            'BOLO-ESPECIAL',
+            name='Bolo Especial',
+            base_price_q=5000,  # R$ 50.00
+            shelflife=3,  # 3 days
+            availability_policy='demand_ok',
+        )
+
+
+@pytest.fixture(scope='session')
+def vitrine(django_db_setup, django_db_blocker):
+    """Get or create vitrine position once per session."""
+    with django_db_blocker.unblock():
+        position, _ = Position.objects.get_or_create(
+            code='vitrine',
+            defaults={
+                'name': 'Vitrine Principal',
+                'kind': PositionKind.PHYSICAL,
+                'is_saleable': True
+            }
+        )
+    return position
 
 
-@pytest.fixture
-def product(db):
-    """Create a test product (non-perishable)."""
-    return Product.objects.create(
-        sku='PAO-FORMA',
-        name='Pao de Forma',
-        unit='un',
-        base_price_q=1000,  # R$ 10.00
-        is_available=True,
-        shelflife=None,  # Non-perishable
-        availability_policy='planned_ok',
-    )
+@pytest.fixture(scope='session')
+def producao(django_db_setup, django_db_blocker):
+    """Get or create production position once per session."""
+    with django_db_blocker.unblock():
+        position, _ = Position.objects.get_or_create(
+            code='producao',
+            defaults={
+                'name': 'Area de Producao',
+                'kind': PositionKind.PHYSICAL,
+                'is_saleable': False
+            }
+        )
+    return position
 
 
 @pytest.fixture
-def perishable_product(db):
-    """Create a perishable product (shelflife=0, same day only)."""
-    return Product.objects.create(
-        sku='CROISSANT',
-        name='Croissant',
-        unit='un',
-        base_price_q=800,  # R$ 8.00
-        is_available=True,
-        shelflife=0,  # Same day only
-        availability_policy='planned_ok',
-    )
+def now(monkeypatch):
+    """
+    Freeze timezone.now() for the test and return the frozen instant.
 
-
-@pytest.fixture
-def demand_product(db):
-    """Create a product that accepts demand."""
-    return Product.objects.create(
-        sku='BOLO-ESPECIAL',
-        name='Bolo Especial',
-        unit='un',
-        base_price_q=5000,  # R$ 50.00
-        is_available=True,
-        shelflife=3,  # 3 days
-        availability_policy='demand_ok',
-    )
+    Frozen at the real current time (not a fixed date), so date.today()
+    and auto_now_add timestamps stay consistent with each other.
+    """
+    frozen = timezone.now()
+    monkeypatch.setattr(timezone, 'now', lambda: frozen)
+    return frozen
 
 
 @pytest.fixture
-def vitrine(db):
-    """Get or create vitrine position."""
-    position, _ = Position.objects.get_or_create(
-        code='vitrine',
-        defaults={
-            'name': 'Vitrine Principal',
-            'kind': PositionKind.PHYSICAL,
-            'is_saleable': True
-        }
-    )
-    return position
+def future_expiry(now):
+    """Hold expiry one hour from now (still active)."""
+    return now + timedelta(hours=1)
 
 
 @pytest.fixture
-def producao(db):
-    """Get or create production position."""
-    position, _ = Position.objects.get_or_create(
-        code='producao',
-        defaults={
-            'name': 'Area de Producao',
-            'kind': PositionKind.PHYSICAL,
-            'is_saleable': False
-        }
-    )
-    return position
+def past_expiry(now):
+    """Hold expiry one hour ago (already expired)."""
+    return now - timedelta(hours=1)
 
 
 @pytest.fixture
 def today():
-    """Return today's date."""
+    """
+    Return today's date.
+
+    Per test, like the services' own date.today() calls, so a run that
+    crosses midnight doesn't set up tests with yesterday's date.
+    """
     return date.today()
 
 
 @pytest.fixture
-def tomorrow():
+def tomorrow(today):
     """Return tomorrow's date."""
-    return date.today() + timedelta(days=1)
+    return today + timedelta(days=1)
 
 
 @pytest.fixture
-def friday():
+def friday(today):
     """Return next Friday's date."""
-    today = date.today()
     days_until_friday = (4 - today.weekday()) % 7
     if days_until_friday == 0:
         days_until_friday = 7
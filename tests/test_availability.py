@@ -9,492 +9,382 @@ from datetime import date, timedelta
 from decimal import Decimal
 
 import pytest
-from django.contrib.contenttypes.models import ContentType
-from django.utils import timezone
+from django.db import connection, transaction
 
 from stockman import stock
 from stockman.models import Quant, Hold, Position
-
-
-pytestmark = pytest.mark.django_db
+from stockman.services.contenttypes import ct_for, product_key_for
+
+
+# Every test runs with timezone.now() frozen (see the `now` fixture)
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures('now')]
+
+# Frequently used quantities, parsed once
+D0, D10, D15, D20, D25, D30, D50, D80, D100 = (
+    Decimal(n) for n in ('0', '10', '15', '20', '25', '30', '50', '80', '100')
+)
+
+
+def _quant(product, position, target_date, quantity):
+    """
+    Insert a Quant directly (no Move), as a fixed stock snapshot.
+
+    Single-row bulk_create(): no save() signal dispatch, pk still set.
+    """
+    quant, = Quant.objects.bulk_create([Quant(
+        content_type=ct_for(product),
+        object_id=product.pk,
+        position=position,
+        target_date=target_date,
+        _quantity=quantity,
+    )])
+    return quant
+
+
+def _hold(quant, quantity, status='pending', expires_at=None):
+    """Insert a Hold linked to quant, for the quant's product and date."""
+    hold, = Hold.objects.bulk_create([Hold(
+        quant=quant,
+        content_type_id=quant.content_type_id,
+        object_id=quant.object_id,
+        target_date=quant.target_date,
+        quantity=quantity,
+        status=status,
+        expires_at=expires_at,
+    )])
+    return hold
+
+
+@pytest.fixture
+def products_by_name(product, perishable_product, demand_product):
+    """
+    The session product fixtures, by fixture name, for parametrized tests.
+
+    Requesting them statically makes pytest create the session rows
+    before the test's transaction starts; request.getfixturevalue() would
+    create them inside it, and they'd be rolled back while still cached.
+    """
+    return {
+        'product': product,
+        'perishable_product': perishable_product,
+        'demand_product': demand_product,
+    }
+
+
+@pytest.fixture
+def quant_50(product, vitrine, today):
+    """Today's Quant of 50 for product at vitrine — the common hold test base."""
+    return _quant(product, vitrine, today, D50)
 
 
 class TestBasicAvailability:
     """Tests for basic availability computation."""
 
-    def test_available_equals_quant_quantity(self, product, vitrine, today):
+    def test_available_equals_quant_quantity(self, quant_50, product, today):
         """Availability equals the Quant quantity when no holds exist."""
-        ct = ContentType.objects.get_for_model(product)
-
-        Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
         available = stock.available(product, today)
-        assert available == Decimal('50')
+        assert available == D50
 
     def test_available_zero_without_quant(self, product, today):
         """Availability is zero when no Quant exists."""
         available = stock.available(product, today)
-        assert available == Decimal('0')
+        assert available == D0
 
     def test_available_zero_with_zero_quant(self, product, vitrine, today):
         """Availability is zero when Quant quantity is zero."""
-        ct = ContentType.objects.get_for_model(product)
-
-        Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('0'),
-        )
+        _quant(product, vitrine, today, D0)
 
         available = stock.available(product, today)
-        assert available == Decimal('0')
+        assert available == D0
 
 
 class TestHoldsReduceAvailability:
-    """Tests that pending holds reduce availability."""
-
-    def test_pending_hold_reduces_availability(self, product, vitrine, today):
-        """A pending hold reduces available quantity."""
-        ct = ContentType.objects.get_for_model(product)
-
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='pending',
-            expires_at=timezone.now() + timedelta(hours=1),
-        )
-
-        available = stock.available(product, today)
-        assert available == Decimal('30')
-
-    def test_confirmed_hold_reduces_availability(self, product, vitrine, today):
-        """A confirmed hold also reduces available quantity."""
-        ct = ContentType.objects.get_for_model(product)
-
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='confirmed',
-            expires_at=None,
+    """Tests that active holds reduce availability."""
+
+    @pytest.mark.parametrize('status, expires_in', [
+        pytest.param('pending', timedelta(hours=1), id='pending'),
+        pytest.param('confirmed', None, id='confirmed-no-expiration'),
+        pytest.param('pending', timedelta(seconds=1), id='pending-about-to-expire'),
+    ])
+    def test_active_hold_reduces_availability(
+        self, quant_50, product, today, now, status, expires_in
+    ):
+        """An active (pending or confirmed, unexpired) hold reduces available quantity."""
+        _hold(
+            quant_50, D20,
+            status=status,
+            expires_at=now + expires_in if expires_in else None,
         )
 
         available = stock.available(product, today)
-        assert available == Decimal('30')
+        assert available == D30
 
-    def test_multiple_holds_summed(self, product, vitrine, today):
+    def test_multiple_holds_summed(self, product, product_ct, vitrine, today, future_expiry):
         """Multiple holds are summed to reduce availability."""
-        ct = ContentType.objects.get_for_model(product)
+        ct = product_ct
+        pid = product.pk
 
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('100'),
-        )
+        quant = _quant(product, vitrine, today, D100)
 
-        for i in range(5):
-            Hold.objects.create(
+        Hold.objects.bulk_create([
+            Hold(
                 quant=quant,
                 content_type=ct,
-                object_id=product.pk,
+                object_id=pid,
                 target_date=today,
-                quantity=Decimal('15'),
+                quantity=D15,
                 status='pending',
-                expires_at=timezone.now() + timedelta(hours=1),
+                expires_at=future_expiry,
             )
+            for _ in range(5)
+        ])
 
         # 100 - (5 * 15) = 25
         available = stock.available(product, today)
-        assert available == Decimal('25')
+        assert available == D25
 
-    def test_hold_equals_quant_gives_zero(self, product, vitrine, today):
+    def test_hold_equals_quant_gives_zero(self, quant_50, product, today, future_expiry):
         """Hold equal to quant quantity results in zero availability."""
-        ct = ContentType.objects.get_for_model(product)
-
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('50'),
-            status='pending',
-            expires_at=timezone.now() + timedelta(hours=1),
-        )
+        _hold(quant_50, D50, expires_at=future_expiry)
 
         available = stock.available(product, today)
-        assert available == Decimal('0')
-
+        assert available == D0
 
-class TestExpiredHoldsIgnored:
-    """Tests that expired holds do not reduce availability."""
 
-    def test_expired_hold_not_counted(self, product, vitrine, today):
-        """An expired hold does not reduce availability."""
-        ct = ContentType.objects.get_for_model(product)
+class TestInactiveHoldsIgnored:
+    """Tests that expired, released and fulfilled holds do not reduce availability."""
 
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='pending',
-            expires_at=timezone.now() - timedelta(hours=1),
+    @pytest.mark.parametrize('status, expires_in', [
+        pytest.param('pending', -timedelta(hours=1), id='expired'),
+        pytest.param('released', timedelta(hours=1), id='released'),
+        # Fulfilled: the quant was already decremented by the exit Move
+        pytest.param('fulfilled', None, id='fulfilled'),
+    ])
+    def test_inactive_hold_not_counted(
+        self, quant_50, product, today, now, status, expires_in
+    ):
+        """An inactive hold leaves availability equal to the quant quantity."""
+        _hold(
+            quant_50, D20,
+            status=status,
+            expires_at=now + expires_in if expires_in else None,
         )
 
         available = stock.available(product, today)
-        assert available == Decimal('50')
+        assert available == D50
 
-    def test_mix_valid_and_expired_holds(self, product, vitrine, today):
+    def test_mix_valid_and_expired_holds(
+        self, product, product_ct, vitrine, today, future_expiry, past_expiry
+    ):
         """Only valid holds reduce availability; expired ones are ignored."""
-        ct = ContentType.objects.get_for_model(product)
+        ct = product_ct
+        pid = product.pk
 
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('100'),
-        )
-
-        # Valid hold: 20
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='pending',
-            expires_at=timezone.now() + timedelta(hours=1),
-        )
+        quant = _quant(product, vitrine, today, D100)
 
-        # Expired hold: 30 (should be ignored)
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('30'),
-            status='pending',
-            expires_at=timezone.now() - timedelta(hours=1),
-        )
+        Hold.objects.bulk_create([
+            # Valid hold: 20
+            Hold(
+                quant=quant,
+                content_type=ct,
+                object_id=pid,
+                target_date=today,
+                quantity=D20,
+                status='pending',
+                expires_at=future_expiry,
+            ),
+            # Expired hold: 30 (should be ignored)
+            Hold(
+                quant=quant,
+                content_type=ct,
+                object_id=pid,
+                target_date=today,
+                quantity=D30,
+                status='pending',
+                expires_at=past_expiry,
+            ),
+        ])
 
         # Available = 100 - 20 = 80
         available = stock.available(product, today)
-        assert available == Decimal('80')
-
-
-class TestReleasedHoldsIgnored:
-    """Tests that released holds do not reduce availability."""
-
-    def test_released_hold_not_counted(self, product, vitrine, today):
-        """A released hold does not reduce availability."""
-        ct = ContentType.objects.get_for_model(product)
-
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='released',
-            expires_at=timezone.now() + timedelta(hours=1),
-        )
-
-        available = stock.available(product, today)
-        assert available == Decimal('50')
-
-    def test_fulfilled_hold_not_counted(self, product, vitrine, today):
-        """A fulfilled hold does not reduce availability (quant already decremented)."""
-        ct = ContentType.objects.get_for_model(product)
-
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('30'),  # Already decremented by fulfillment
-        )
-
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='fulfilled',
-            expires_at=None,
-        )
-
-        # Available = 30 (fulfilled hold not counted against availability)
-        available = stock.available(product, today)
-        assert available == Decimal('30')
+        assert available == D80
 
 
 class TestShelflife:
     """Tests for shelflife affecting availability."""
 
-    def test_shelflife_zero_only_same_day(self, perishable_product, vitrine, today):
-        """shelflife=0 product is only available on its production date."""
-        yesterday = today - timedelta(days=1)
-        ct = ContentType.objects.get_for_model(perishable_product)
-
-        # Stock from yesterday
-        Quant.objects.create(
-            content_type=ct,
-            object_id=perishable_product.pk,
-            position=vitrine,
-            target_date=yesterday,
-            _quantity=Decimal('100'),
-        )
-
-        # Stock from today
-        Quant.objects.create(
-            content_type=ct,
-            object_id=perishable_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('30'),
-        )
-
-        # Only today's stock should count
-        available = stock.available(perishable_product, today)
-        assert available == Decimal('30')
-
-    def test_shelflife_includes_valid_stock(self, demand_product, vitrine, today):
-        """Product with shelflife>0 includes stock within validity period."""
-        yesterday = today - timedelta(days=1)
-        ct = ContentType.objects.get_for_model(demand_product)
-
-        # Stock from yesterday (shelflife=3, so still valid)
-        Quant.objects.create(
-            content_type=ct,
-            object_id=demand_product.pk,
-            position=vitrine,
-            target_date=yesterday,
-            _quantity=Decimal('50'),
-        )
-
-        # Stock from today
-        Quant.objects.create(
-            content_type=ct,
-            object_id=demand_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('30'),
-        )
-
-        available = stock.available(demand_product, today)
-        assert available == Decimal('80')
-
-    def test_shelflife_expired_stock_excluded(self, demand_product, vitrine, today):
-        """Product with shelflife>0 excludes stock past expiry."""
-        old_date = today - timedelta(days=10)  # Well past shelflife=3
-        ct = ContentType.objects.get_for_model(demand_product)
-
-        # Stock from 10 days ago (expired, shelflife=3)
-        Quant.objects.create(
-            content_type=ct,
-            object_id=demand_product.pk,
-            position=vitrine,
-            target_date=old_date,
-            _quantity=Decimal('100'),
-        )
-
-        # Stock from today
-        Quant.objects.create(
-            content_type=ct,
-            object_id=demand_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('20'),
-        )
-
-        available = stock.available(demand_product, today)
-        assert available == Decimal('20')
+    @pytest.mark.parametrize('product_fixture, days_ago, old_qty, expected', [
+        # shelflife=0: yesterday's stock is not valid today
+        pytest.param('perishable_product', 1, D100, D30, id='same-day-only'),
+        # shelflife=3: yesterday's stock still counts
+        pytest.param('demand_product', 1, D50, D50 + D30, id='within-shelflife'),
+        # shelflife=3: stock from 10 days ago is expired
+        pytest.param('demand_product', 10, D100, D30, id='past-shelflife'),
+    ])
+    def test_older_stock_counts_only_within_shelflife(
+        self, products_by_name, vitrine, today, product_fixture, days_ago, old_qty, expected
+    ):
+        """Older stock counts toward today's availability only while within shelflife."""
+        product = products_by_name[product_fixture]
+        ct = ct_for(product)
+
+        # Older and today's stock in one INSERT
+        Quant.objects.bulk_create([
+            Quant(content_type=ct, object_id=product.pk, position=vitrine,
+                  target_date=today - timedelta(days=days_ago), _quantity=old_qty),
+            Quant(content_type=ct, object_id=product.pk, position=vitrine,
+                  target_date=today, _quantity=D30),
+        ])
+
+        assert stock.available(product, today) == expected
+
+
+@pytest.fixture(scope='class')
+def two_quants(
+    django_db_blocker, product, product_ct, perishable_product, vitrine
+):
+    """
+    Today's stock for product (30) and perishable_product (50).
+
+    Inserted once for the class inside an outer atomic block; each
+    test's own transaction nests as a savepoint and rolls back to it.
+    The date is fixed here (the `today` fixture is per test), so tests
+    read it back from the quants' target_date.
+    """
+    today = date.today()
+    with django_db_blocker.unblock(), transaction.atomic():
+        quants = Quant.objects.bulk_create([
+            Quant(
+                content_type=product_ct,
+                object_id=product.pk,
+                position=vitrine,
+                target_date=today,
+                _quantity=D30,
+            ),
+            Quant(
+                content_type=ct_for(perishable_product),
+                object_id=perishable_product.pk,
+                position=vitrine,
+                target_date=today,
+                _quantity=D50,
+            ),
+        ])
+        yield quants
+        transaction.set_rollback(True)
 
 
 class TestMultipleProductsIndependent:
     """Tests that availability is independent per product."""
 
     def test_different_products_independent(
-        self, product, perishable_product, vitrine, today
+        self, two_quants, product, perishable_product
     ):
         """Availability of different products is independent."""
-        ct_a = ContentType.objects.get_for_model(product)
-        ct_b = ContentType.objects.get_for_model(perishable_product)
-
-        Quant.objects.create(
-            content_type=ct_a,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('30'),
-        )
-
-        Quant.objects.create(
-            content_type=ct_b,
-            object_id=perishable_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
-
+        today = two_quants[0].target_date
         avail_a = stock.available(product, today)
         avail_b = stock.available(perishable_product, today)
 
-        assert avail_a == Decimal('30')
-        assert avail_b == Decimal('50')
+        assert avail_a == D30
+        assert avail_b == D50
 
     def test_hold_affects_only_target_product(
-        self, product, perishable_product, vitrine, today
+        self, two_quants, product, perishable_product, future_expiry
     ):
         """Hold on one product does not affect another."""
-        ct_a = ContentType.objects.get_for_model(product)
-        ct_b = ContentType.objects.get_for_model(perishable_product)
-
-        quant_a = Quant.objects.create(
-            content_type=ct_a,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('30'),
-        )
-
-        Quant.objects.create(
-            content_type=ct_b,
-            object_id=perishable_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
+        quant_a, _ = two_quants
+        today = quant_a.target_date
 
         # Hold only on product A
-        Hold.objects.create(
-            quant=quant_a,
-            content_type=ct_a,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='pending',
-            expires_at=timezone.now() + timedelta(hours=1),
-        )
+        _hold(quant_a, D20, expires_at=future_expiry)
 
         # Product A: 30 - 20 = 10
-        assert stock.available(product, today) == Decimal('10')
+        assert stock.available(product, today) == D10
         # Product B: still 50 (unaffected)
-        assert stock.available(perishable_product, today) == Decimal('50')
+        assert stock.available(perishable_product, today) == D50
 
 
-class TestHoldExpiration:
-    """Tests for hold expiration edge cases."""
+class TestQueryBudget:
+    """
+    Query counts of the single-product reads.
 
-    def test_hold_about_to_expire_still_counts(self, product, vitrine, today):
-        """A hold expiring in 1 second still reduces availability."""
-        ct = ContentType.objects.get_for_model(product)
+    available() folds the Quant and Hold sums into one SELECT; committed()
+    is one aggregate. Any increase here must be justified.
+    """
 
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
+    @pytest.mark.parametrize('at_position', [
+        pytest.param(False, id='all-positions'),
+        pytest.param(True, id='one-position'),
+    ])
+    def test_available_is_one_query(
+        self, quant_50, product, vitrine, today, future_expiry,
+        at_position, django_assert_num_queries
+    ):
+        """available() costs one query with stock and holds present."""
+        _hold(quant_50, D20, expires_at=future_expiry)
+        position = vitrine if at_position else None
 
-        # Hold expires in 1 second (still active)
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='pending',
-            expires_at=timezone.now() + timedelta(seconds=1),
-        )
+        with django_assert_num_queries(1):
+            available = stock.available(product, today, position=position)
 
-        available = stock.available(product, today)
-        assert available == Decimal('30')
+        assert available == D30
 
-    def test_confirmed_hold_no_expiration(self, product, vitrine, today):
-        """Confirmed hold without expiration always reduces availability."""
-        ct = ContentType.objects.get_for_model(product)
+    def test_committed_is_one_query(
+        self, quant_50, product, today, future_expiry, django_assert_num_queries
+    ):
+        """committed() costs one aggregate query."""
+        _hold(quant_50, D20, expires_at=future_expiry)
 
-        quant = Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
+        with django_assert_num_queries(1):
+            committed = stock.committed(product, today)
 
-        # Confirmed hold, no expiration
-        Hold.objects.create(
-            quant=quant,
-            content_type=ct,
-            object_id=product.pk,
-            target_date=today,
-            quantity=Decimal('20'),
-            status='confirmed',
-            expires_at=None,
-        )
+        assert committed == D20
 
-        available = stock.available(product, today)
-        assert available == Decimal('30')
+
+class TestAvailableBulk:
+    """Tests for stock.available_bulk()."""
+
+    def test_matches_available_per_product(
+        self, product, perishable_product, demand_product, vitrine, today, future_expiry
+    ):
+        """Bulk result equals available() for each product, shelflife included."""
+        yesterday = today - timedelta(days=1)
+
+        quant_a = _quant(product, vitrine, today, D30)
+        # Yesterday's perishable stock (shelflife=0) is not valid today
+        _quant(perishable_product, vitrine, yesterday, D50)
+        _hold(quant_a, D10, expires_at=future_expiry)
+
+        products = [product, perishable_product, demand_product]
+        result = stock.available_bulk(products, today)
+
+        assert result == {
+            product.pk: D20,
+            perishable_product.pk: D0,
+            demand_product.pk: D0,
+        }
+        for p in products:
+            assert result[p.pk] == stock.available(p, today)
+
+    def test_two_queries_for_many_products(
+        self, product, perishable_product, vitrine, today, django_assert_num_queries
+    ):
+        """
+        One grouped Quant sum plus one grouped Hold sum, whatever the product count.
+
+        ContentTypes are preloaded for the session, so no lookup query counts here.
+        """
+        _quant(product, vitrine, today, D30)
+        _quant(perishable_product, vitrine, today, D50)
+
+        with django_assert_num_queries(2):
+            result = stock.available_bulk([product, perishable_product], today)
+
+        assert result[product.pk] == D30
+        assert result[perishable_product.pk] == D50
+
+    def test_empty_input(self, today):
+        """No products, no queries, empty dict."""
+        assert stock.available_bulk([], today) == {}
 
 
 class TestFutureDates:
@@ -503,41 +393,77 @@ class TestFutureDates:
     def test_future_date_no_stock_perishable(self, perishable_product, vitrine, today):
         """Perishable stock planned for today is NOT available 5 days later."""
         future = today + timedelta(days=5)
-        ct = ContentType.objects.get_for_model(perishable_product)
 
         # Perishable stock (shelflife=0) planned for today
-        Quant.objects.create(
-            content_type=ct,
-            object_id=perishable_product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
+        _quant(perishable_product, vitrine, today, D50)
 
         # shelflife=0 means same-day only — not valid 5 days later
         available = stock.available(perishable_product, future)
-        assert available == Decimal('0')
+        assert available == D0
 
     def test_future_date_non_perishable_still_available(self, product, vitrine, today):
         """Non-perishable stock planned for today IS available on future dates."""
         future = today + timedelta(days=5)
-        ct = ContentType.objects.get_for_model(product)
 
-        Quant.objects.create(
-            content_type=ct,
-            object_id=product.pk,
-            position=vitrine,
-            target_date=today,
-            _quantity=Decimal('50'),
-        )
+        _quant(product, vitrine, today, D50)
 
         # Non-perishable: production from today is still valid in 5 days
         available = stock.available(product, future)
-        assert available == Decimal('50')
-
-    def test_planned_stock_available_on_target_date(self, product, friday):
-        """Planned stock (via stock.plan) is available on target date."""
-        stock.plan(Decimal('50'), product, friday, reason='Producao sexta')
-
-        assert stock.available(product, friday) == Decimal('50')
-        assert stock.available(product, friday - timedelta(days=1)) == Decimal('0')
+        assert available == D50
+
+    @pytest.mark.parametrize('product_fixture, offset, expected', [
+        # Not available before the planned date
+        pytest.param('product', -1, D0, id='non-perishable-day-before'),
+        pytest.param('product', 0, D50, id='non-perishable-target-day'),
+        # shelflife=None: valid indefinitely after the planned date
+        pytest.param('product', 30, D50, id='non-perishable-later'),
+        # shelflife=3: valid through target + 3, gone the day after
+        pytest.param('demand_product', 3, D50, id='shelflife-last-day'),
+        pytest.param('demand_product', 4, D0, id='shelflife-expired'),
+    ])
+    def test_planned_stock_availability_boundaries(
+        self, products_by_name, vitrine, friday, product_fixture, offset, expected
+    ):
+        """Planned stock is available from its target date until shelflife ends."""
+        product = products_by_name[product_fixture]
+        # Planned Quant inserted directly; stock.plan() is covered in test_service
+        _quant(product, vitrine, friday, D50)
+
+        assert stock.available(product, friday + timedelta(days=offset)) == expected
+
+
+class TestAvailabilityQueryPlan:
+    """The active-holds filter behind available() is index-backed."""
+
+    @pytest.mark.skipif(
+        connection.vendor not in ('sqlite', 'postgresql'),
+        reason="Plan assertions written for SQLite and PostgreSQL",
+    )
+    def test_hold_filter_uses_index(self, product, today):
+        """The Hold lookup is planned as an index scan, not a table scan."""
+        holds = Hold.objects.filter(
+            product_key=product_key_for(product),
+            target_date=today,
+        ).active()
+
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are seq-scanned regardless of indexes;
+            # SET LOCAL ends with the test's transaction
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = holds.explain()
+            assert 'Seq Scan' not in plan
+            assert 'Index Scan' in plan or 'Index Only Scan' in plan  # incl. Bitmap Index Scan
+        else:
+            plan = holds.explain()
+            assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+
+    def test_hold_product_date_index_exists(self):
+        """The (product_key, target_date, status, expires_at) index is migrated."""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Hold._meta.db_table)
+
+        assert any(
+            c['index'] and c['columns'] == ['product_key', 'target_date', 'status', 'expires_at']
+            for c in constraints.values()
+        )
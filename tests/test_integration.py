@@ -5,18 +5,23 @@ Tests the complete stock flow using Stockman service API
 with Offerman products: receive, hold, confirm, fulfill, release.
 """
 
-from datetime import date, timedelta
+from datetime import timedelta
 from decimal import Decimal
 
 import pytest
-from django.utils import timezone
+from django.db import connection
 
 from stockman import stock, StockError
-from stockman.models import Position, Quant, Hold, HoldStatus
+from stockman.models import Quant, Hold, HoldStatus
 
 
 pytestmark = pytest.mark.django_db
 
+# Frequently used quantities, parsed once (hot in the stress loops)
+D0, D1, D5, D10, D20, D30, D50, D80, D100 = (
+    Decimal(n) for n in ('0', '1', '5', '10', '20', '30', '50', '80', '100')
+)
+
 
 class TestStockLifecycle:
     """Tests for the full receive -> hold -> confirm -> fulfill flow."""
@@ -24,11 +29,11 @@ class TestStockLifecycle:
     def test_receive_hold_confirm_fulfill(self, product, vitrine, today):
         """Complete lifecycle: receive -> hold -> confirm -> fulfill."""
         # 1. Receive stock
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada inicial')
-        assert stock.available(product, today) == Decimal('100')
+        stock.receive(D100, product, vitrine, reason='Entrada inicial')
+        assert stock.available(product, today) == D100
 
         # 2. Hold stock
-        hold_id = stock.hold(Decimal('10'), product, today)
+        hold_id = stock.hold(D10, product, today)
         assert stock.available(product, today) == Decimal('90')
 
         # 3. Confirm hold
@@ -45,16 +50,48 @@ class TestStockLifecycle:
         hold_obj = Hold.objects.get(pk=int(hold_id.split(':')[1]))
         assert hold_obj.status == HoldStatus.FULFILLED
 
-    def test_receive_multiple_holds_then_fulfill_all(self, product, vitrine, today):
+    def test_lifecycle_query_budget(
+        self, product, vitrine, today, django_assert_num_queries
+    ):
+        """
+        Query count of each hold transition.
+
+        Budgets include the SAVEPOINT/RELEASE pairs of the services' atomic
+        blocks (the test runs inside a transaction). Any increase here
+        must be justified.
+        """
+        postgres = connection.vendor == 'postgresql'
+        stock.receive(D100, product, vitrine, reason='Entrada')
+
+        # savepoint, [advisory lock], locked FIFO quant pick, INSERT hold, release
+        with django_assert_num_queries(5 if postgres else 4):
+            first = stock.hold(D10, product, today)
+        second = stock.hold(D10, product, today)
+
+        # conditional UPDATE, read back
+        with django_assert_num_queries(2):
+            stock.confirm(first)
+
+        # savepoint, UPDATE hold, read hold, Move savepoint, INSERT move,
+        # UPDATE quant cache, release x2
+        with django_assert_num_queries(8):
+            stock.fulfill(first)
+
+        # savepoint, UPDATE (jsonb_set reason on PostgreSQL), read back,
+        # [metadata write elsewhere], release
+        with django_assert_num_queries(4 if postgres else 5):
+            stock.release(second, reason='Cancelado')
+
+    def test_receive_multiple_holds_then_fulfill_all(self, product, product_ct, vitrine, today):
         """Multiple holds from same stock, all fulfilled."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
         hold_ids = []
         for i in range(5):
-            hid = stock.hold(Decimal('10'), product, today)
+            hid = stock.hold(D10, product, today)
             hold_ids.append(hid)
 
-        assert stock.available(product, today) == Decimal('50')
+        assert stock.available(product, today) == D50
 
         # Confirm and fulfill all
         for hid in hold_ids:
@@ -62,22 +99,20 @@ class TestStockLifecycle:
             stock.fulfill(hid)
 
         # All fulfilled: quant should have decreased by 50 total
-        quant = Quant.objects.filter(
-            object_id=product.pk,
-        ).first()
-        assert quant._quantity == Decimal('50')
+        quant = Quant.objects.get(content_type=product_ct, object_id=product.pk)
+        assert quant._quantity == D50
 
     def test_perishable_product_lifecycle(self, perishable_product, vitrine, today):
         """Perishable product (shelflife=0) follows same lifecycle."""
-        stock.receive(Decimal('50'), perishable_product, vitrine, reason='Producao do dia')
+        stock.receive(D50, perishable_product, vitrine, reason='Producao do dia')
 
         # Available only on same day
-        assert stock.available(perishable_product, today) == Decimal('50')
-        assert stock.available(perishable_product, today + timedelta(days=1)) == Decimal('0')
+        assert stock.available(perishable_product, today) == D50
+        assert stock.available(perishable_product, today + timedelta(days=1)) == D0
 
         # Hold and fulfill
-        hold_id = stock.hold(Decimal('20'), perishable_product, today)
-        assert stock.available(perishable_product, today) == Decimal('30')
+        hold_id = stock.hold(D20, perishable_product, today)
+        assert stock.available(perishable_product, today) == D30
 
         stock.confirm(hold_id)
         stock.fulfill(hold_id)
@@ -85,7 +120,7 @@ class TestStockLifecycle:
     def test_demand_product_hold_without_stock(self, demand_product, friday):
         """Demand product can be held without physical stock."""
         # No stock received, but demand_ok policy allows hold
-        hold_id = stock.hold(Decimal('5'), demand_product, friday)
+        hold_id = stock.hold(D5, demand_product, friday)
         assert hold_id is not None
 
         hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
@@ -94,7 +129,7 @@ class TestStockLifecycle:
 
         # Confirm demand hold
         stock.confirm(hold_id)
-        hold.refresh_from_db()
+        hold.refresh_from_db(fields=['status'])
         assert hold.status == HoldStatus.CONFIRMED
 
 
@@ -103,30 +138,30 @@ class TestMultipleHoldsAndAvailability:
 
     def test_sequential_holds_reduce_availability(self, product, vitrine, today):
         """Each hold reduces available quantity."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
-        stock.hold(Decimal('20'), product, today)
-        assert stock.available(product, today) == Decimal('80')
+        stock.hold(D20, product, today)
+        assert stock.available(product, today) == D80
 
-        stock.hold(Decimal('30'), product, today)
-        assert stock.available(product, today) == Decimal('50')
+        stock.hold(D30, product, today)
+        assert stock.available(product, today) == D50
 
-        stock.hold(Decimal('50'), product, today)
-        assert stock.available(product, today) == Decimal('0')
+        stock.hold(D50, product, today)
+        assert stock.available(product, today) == D0
 
     def test_holds_from_different_products_independent(
         self, product, perishable_product, vitrine, today
     ):
         """Holds on different products do not affect each other."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada produto A')
-        stock.receive(Decimal('50'), perishable_product, vitrine, reason='Entrada produto B')
+        stock.receive(D100, product, vitrine, reason='Entrada produto A')
+        stock.receive(D50, perishable_product, vitrine, reason='Entrada produto B')
 
-        stock.hold(Decimal('30'), product, today)
+        stock.hold(D30, product, today)
 
         # Product A: 100 - 30 = 70
         assert stock.available(product, today) == Decimal('70')
         # Product B: unaffected
-        assert stock.available(perishable_product, today) == Decimal('50')
+        assert stock.available(perishable_product, today) == D50
 
 
 class TestHoldReleaseRestoresAvailability:
@@ -134,80 +169,80 @@ class TestHoldReleaseRestoresAvailability:
 
     def test_release_pending_hold(self, product, vitrine, today):
         """Releasing a pending hold restores availability."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
         hold_id = stock.hold(Decimal('40'), product, today)
         assert stock.available(product, today) == Decimal('60')
 
         stock.release(hold_id, reason='Cliente cancelou')
-        assert stock.available(product, today) == Decimal('100')
+        assert stock.available(product, today) == D100
 
     def test_release_confirmed_hold(self, product, vitrine, today):
         """Releasing a confirmed hold also restores availability."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
         hold_id = stock.hold(Decimal('25'), product, today)
         stock.confirm(hold_id)
         assert stock.available(product, today) == Decimal('75')
 
         stock.release(hold_id, reason='Pedido cancelado')
-        assert stock.available(product, today) == Decimal('100')
+        assert stock.available(product, today) == D100
 
     def test_release_and_re_hold(self, product, vitrine, today):
         """After releasing, stock can be held again."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
 
-        hold_id = stock.hold(Decimal('10'), product, today)
-        assert stock.available(product, today) == Decimal('0')
+        hold_id = stock.hold(D10, product, today)
+        assert stock.available(product, today) == D0
 
         stock.release(hold_id, reason='Cancelado')
-        assert stock.available(product, today) == Decimal('10')
+        assert stock.available(product, today) == D10
 
-        new_hold_id = stock.hold(Decimal('10'), product, today)
-        assert stock.available(product, today) == Decimal('0')
+        new_hold_id = stock.hold(D10, product, today)
+        assert stock.available(product, today) == D0
         assert new_hold_id != hold_id
 
 
 class TestExpiredHoldHandling:
     """Tests that expired holds do not block availability."""
 
-    def test_expired_hold_ignored_in_availability(self, product, vitrine, today):
+    def test_expired_hold_ignored_in_availability(self, product, vitrine, today, now):
         """Expired holds do not reduce available quantity."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
         # Create hold that's already expired
-        expired_at = timezone.now() - timedelta(minutes=1)
-        stock.hold(Decimal('50'), product, today, expires_at=expired_at)
+        expired_at = now - timedelta(minutes=1)
+        stock.hold(D50, product, today, expires_at=expired_at)
 
         # Available should be full (expired hold ignored)
-        assert stock.available(product, today) == Decimal('100')
+        assert stock.available(product, today) == D100
 
-    def test_new_hold_succeeds_after_expiry(self, product, vitrine, today):
+    def test_new_hold_succeeds_after_expiry(self, product, vitrine, today, now):
         """Can create a new hold after a previous one expired."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
 
         # First hold takes all, but expires
-        expired_at = timezone.now() - timedelta(minutes=1)
-        stock.hold(Decimal('10'), product, today, expires_at=expired_at)
+        expired_at = now - timedelta(minutes=1)
+        stock.hold(D10, product, today, expires_at=expired_at)
 
         # New hold should succeed since the old one is expired
-        new_hold_id = stock.hold(Decimal('10'), product, today)
+        new_hold_id = stock.hold(D10, product, today)
         assert new_hold_id is not None
 
-    def test_mix_of_valid_and_expired_holds(self, product, vitrine, today):
+    def test_mix_of_valid_and_expired_holds(self, product, vitrine, today, now):
         """Only valid holds reduce availability; expired ones are ignored."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
-        valid_expires = timezone.now() + timedelta(minutes=30)
-        expired_expires = timezone.now() - timedelta(minutes=5)
+        valid_expires = now + timedelta(minutes=30)
+        expired_expires = now - timedelta(minutes=5)
 
         # Valid hold: 20
-        stock.hold(Decimal('20'), product, today, expires_at=valid_expires)
+        stock.hold(D20, product, today, expires_at=valid_expires)
         # Expired hold: 30 (should be ignored)
-        stock.hold(Decimal('30'), product, today, expires_at=expired_expires)
+        stock.hold(D30, product, today, expires_at=expired_expires)
 
         # Available = 100 - 20 = 80 (expired hold ignored)
-        assert stock.available(product, today) == Decimal('80')
+        assert stock.available(product, today) == D80
 
 
 class TestConcurrentHoldScenarios:
@@ -215,48 +250,51 @@ class TestConcurrentHoldScenarios:
 
     def test_holds_until_exhausted(self, product, vitrine, today):
         """Multiple holds until stock is fully held."""
-        stock.receive(Decimal('5'), product, vitrine, reason='Producao limitada')
+        stock.receive(D5, product, vitrine, reason='Producao limitada')
 
         hold_ids = []
         for i in range(5):
-            hid = stock.hold(Decimal('1'), product, today)
+            hid = stock.hold(D1, product, today)
             hold_ids.append(hid)
 
-        assert stock.available(product, today) == Decimal('0')
+        assert stock.available(product, today) == D0
 
         # Next hold should fail
         with pytest.raises(StockError) as exc:
-            stock.hold(Decimal('1'), product, today)
+            stock.hold(D1, product, today)
 
         assert exc.value.code == 'INSUFFICIENT_AVAILABLE'
 
     def test_cannot_hold_more_than_available(self, product, vitrine, today):
         """Cannot hold more than currently available."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
         stock.hold(Decimal('7'), product, today)
 
         # Only 3 left, requesting 5
         with pytest.raises(StockError) as exc:
-            stock.hold(Decimal('5'), product, today)
+            stock.hold(D5, product, today)
 
         assert exc.value.code == 'INSUFFICIENT_AVAILABLE'
         assert exc.value.data['available'] == Decimal('3')
 
-    def test_many_holds_and_releases(self, product, vitrine, today):
+    def test_many_holds_and_releases(
+        self, product, vitrine, today, django_assert_num_queries
+    ):
         """Create and release many holds, verify consistency."""
         stock.receive(Decimal('1000'), product, vitrine, reason='Grande entrada')
 
         hold_ids = []
         # Create 100 holds of 10 units each
         for i in range(100):
-            hid = stock.hold(Decimal('10'), product, today)
+            hid = stock.hold(D10, product, today)
             hold_ids.append(hid)
 
-        assert stock.available(product, today) == Decimal('0')
+        # Holds are summed in SQL: one query however many there are
+        with django_assert_num_queries(1):
+            assert stock.available(product, today) == D0
 
-        # Release half
-        for hid in hold_ids[:50]:
-            stock.release(hid, reason='Cancelado')
+        # Release half in one call
+        assert stock.release_many(hold_ids[:50], reason='Cancelado') == 50
 
         assert stock.available(product, today) == Decimal('500')
 
@@ -274,25 +312,24 @@ class TestEdgeCases:
     def test_hold_without_stock(self, product, today):
         """Cannot hold when no stock exists."""
         with pytest.raises(StockError) as exc:
-            stock.hold(Decimal('1'), product, today)
+            stock.hold(D1, product, today)
 
         assert exc.value.code == 'INSUFFICIENT_AVAILABLE'
 
-    def test_negative_quantity_rejected(self, product, today):
-        """Negative quantities are rejected."""
-        with pytest.raises(StockError):
-            stock.hold(Decimal('-5'), product, today)
-
-    def test_zero_quantity_rejected(self, product, today):
-        """Zero quantity is rejected."""
+    @pytest.mark.parametrize('quantity', [
+        pytest.param(Decimal('-5'), id='negative'),
+        pytest.param(D0, id='zero'),
+    ])
+    def test_non_positive_hold_rejected(self, product, today, quantity):
+        """Zero and negative hold quantities are rejected."""
         with pytest.raises(StockError):
-            stock.hold(Decimal('0'), product, today)
+            stock.hold(quantity, product, today)
 
     def test_double_confirm_raises_error(self, product, vitrine, today):
         """Confirming an already confirmed hold raises error."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
 
-        hold_id = stock.hold(Decimal('5'), product, today)
+        hold_id = stock.hold(D5, product, today)
         stock.confirm(hold_id)
 
         with pytest.raises(StockError) as exc:
@@ -301,31 +338,29 @@ class TestEdgeCases:
 
     def test_double_release_raises_error(self, product, vitrine, today):
         """Releasing an already released hold raises error."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
 
-        hold_id = stock.hold(Decimal('5'), product, today)
+        hold_id = stock.hold(D5, product, today)
         stock.release(hold_id, reason='Primeiro cancelamento')
 
         with pytest.raises(StockError) as exc:
             stock.release(hold_id, reason='Segundo cancelamento')
         assert exc.value.code == 'INVALID_STATUS'
 
-    def test_receive_zero_raises_error(self, product, vitrine):
-        """Receiving zero quantity raises error."""
-        with pytest.raises(StockError) as exc:
-            stock.receive(Decimal('0'), product, vitrine, reason='Zero')
-        assert exc.value.code == 'INVALID_QUANTITY'
-
-    def test_receive_negative_raises_error(self, product, vitrine):
-        """Receiving negative quantity raises error."""
+    @pytest.mark.parametrize('quantity, reason', [
+        pytest.param(D0, 'Zero', id='zero'),
+        pytest.param(Decimal('-10'), 'Negativo', id='negative'),
+    ])
+    def test_receive_non_positive_raises_error(self, product, vitrine, quantity, reason):
+        """Receiving a zero or negative quantity raises INVALID_QUANTITY."""
         with pytest.raises(StockError) as exc:
-            stock.receive(Decimal('-10'), product, vitrine, reason='Negativo')
+            stock.receive(quantity, product, vitrine, reason=reason)
         assert exc.value.code == 'INVALID_QUANTITY'
 
     def test_fulfill_without_confirm_raises_error(self, product, vitrine, today):
         """Fulfilling a pending (not confirmed) hold raises error."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
 
         with pytest.raises(StockError) as exc:
             stock.fulfill(hold_id)
@@ -337,37 +372,37 @@ class TestStressScenarios:
 
     def test_rapid_hold_release_cycles(self, product, vitrine, today):
         """Rapid hold-release cycles maintain consistency."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
 
         for i in range(50):
-            hold_id = stock.hold(Decimal('10'), product, today)
+            hold_id = stock.hold(D10, product, today)
             stock.release(hold_id, reason=f'Ciclo {i}')
 
         # All released, full availability restored
-        assert stock.available(product, today) == Decimal('100')
+        assert stock.available(product, today) == D100
 
     def test_mixed_operations(self, product, vitrine, today):
         """Mixed receive, hold, release, confirm, fulfill operations."""
         # Initial stock
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada 1')
+        stock.receive(D100, product, vitrine, reason='Entrada 1')
 
         # Hold 30, confirm 20, release 10
-        h1 = stock.hold(Decimal('10'), product, today)
-        h2 = stock.hold(Decimal('10'), product, today)
-        h3 = stock.hold(Decimal('10'), product, today)
+        h1 = stock.hold(D10, product, today)
+        h2 = stock.hold(D10, product, today)
+        h3 = stock.hold(D10, product, today)
 
         stock.confirm(h1)
         stock.confirm(h2)
         stock.release(h3, reason='Cancelado')
 
         # Available: 100 - 10 (confirmed h1) - 10 (confirmed h2) = 80
-        assert stock.available(product, today) == Decimal('80')
+        assert stock.available(product, today) == D80
 
         # Fulfill h1
         stock.fulfill(h1)
 
         # Receive more
-        stock.receive(Decimal('50'), product, vitrine, reason='Entrada 2')
+        stock.receive(D50, product, vitrine, reason='Entrada 2')
 
         # Available: (100 - 10 fulfilled) + 50 - 10 (confirmed h2) = 130
         assert stock.available(product, today) == Decimal('130')
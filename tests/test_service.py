@@ -4,62 +4,74 @@ Tests for Stock service API.
 
 from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 
 import pytest
-from django.utils import timezone
+from django.core.management import call_command
+from django.db import connection, transaction
 
 from stockman import stock, StockError
-from stockman.models import Quant, Move, Hold, HoldStatus
+from stockman.models import Quant, Move, Hold, HoldStatus, StockAlert
+from stockman.models.product_key import pack_product_key
+from stockman.services.alerts import check_alerts
+from stockman.services import cache
+from stockman.services.cache import reset_cache
+from stockman.services.isolation import read_isolated
 
 
 pytestmark = pytest.mark.django_db
 
+# Frequently used quantities, parsed once
+D0, D10, D20, D30, D50, D70, D80, D100 = (
+    Decimal(n) for n in ('0', '10', '20', '30', '50', '70', '80', '100')
+)
+
 
 class TestStockAvailable:
     """Tests for stock.available()."""
     
     def test_available_empty_stock(self, product, today):
         """Available returns 0 when no stock exists."""
-        assert stock.available(product, today) == Decimal('0')
+        assert stock.available(product, today) == D0
     
     def test_available_after_receive(self, product, vitrine, today):
         """Available returns quantity after receive."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada teste')
+        stock.receive(D100, product, vitrine, reason='Entrada teste')
         
-        assert stock.available(product, today) == Decimal('100')
+        assert stock.available(product, today) == D100
     
     def test_available_minus_holds(self, product, vitrine, today):
         """Available = quantity - held."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        stock.hold(Decimal('30'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        stock.hold(D30, product, today)
         
-        assert stock.available(product, today) == Decimal('70')
+        assert stock.available(product, today) == D70
     
     def test_available_respects_shelflife(self, perishable_product, friday):
         """Perishable product (shelflife=0) only available on production date."""
-        stock.plan(Decimal('50'), perishable_product, friday, reason='Produção sexta')
+        stock.plan(D50, perishable_product, friday, reason='Produção sexta')
         
         # Day before: not available
-        assert stock.available(perishable_product, friday - timedelta(days=1)) == Decimal('0')
+        assert stock.available(perishable_product, friday - timedelta(days=1)) == D0
         
         # On the day: available
-        assert stock.available(perishable_product, friday) == Decimal('50')
+        assert stock.available(perishable_product, friday) == D50
         
         # Day after: not available (expired)
-        assert stock.available(perishable_product, friday + timedelta(days=1)) == Decimal('0')
+        assert stock.available(perishable_product, friday + timedelta(days=1)) == D0
     
     def test_available_extended_shelflife(self, demand_product, friday):
         """Product with shelflife=3 available for 3 days after production."""
-        stock.plan(Decimal('10'), demand_product, friday, reason='Produção')
+        stock.plan(D10, demand_product, friday, reason='Produção')
         
         # On production day
-        assert stock.available(demand_product, friday) == Decimal('10')
+        assert stock.available(demand_product, friday) == D10
         
         # 2 days after
-        assert stock.available(demand_product, friday + timedelta(days=2)) == Decimal('10')
+        assert stock.available(demand_product, friday + timedelta(days=2)) == D10
         
         # 4 days after: expired
-        assert stock.available(demand_product, friday + timedelta(days=4)) == Decimal('0')
+        assert stock.available(demand_product, friday + timedelta(days=4)) == D0
 
 
 class TestStockReceive:
@@ -67,24 +79,32 @@ class TestStockReceive:
     
     def test_receive_creates_quant_and_move(self, product, vitrine):
         """Receive creates Quant and Move."""
-        quant = stock.receive(Decimal('50'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
         
-        assert quant._quantity == Decimal('50')
+        assert quant._quantity == D50
         assert quant.moves.count() == 1
-        assert quant.moves.first().delta == Decimal('50')
+        assert quant.moves.first().delta == D50
     
     def test_receive_updates_existing_quant(self, product, vitrine):
         """Multiple receives update same Quant."""
-        stock.receive(Decimal('50'), product, vitrine, reason='Primeira entrada')
-        quant = stock.receive(Decimal('30'), product, vitrine, reason='Segunda entrada')
+        stock.receive(D50, product, vitrine, reason='Primeira entrada')
+        quant = stock.receive(D30, product, vitrine, reason='Segunda entrada')
         
-        assert quant._quantity == Decimal('80')
+        assert quant._quantity == D80
         assert quant.moves.count() == 2
     
+    def test_receive_sets_product_key(self, product, product_ct, vitrine):
+        """Quant.product_key packs content_type_id and object_id."""
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
+
+        quant = Quant.objects.get(pk=quant.pk)
+        assert quant.product_key == pack_product_key(product_ct.pk, product.pk)
+        assert Quant.objects.for_product(product).get() == quant
+    
     def test_receive_invalid_quantity(self, product, vitrine):
         """Receive with quantity <= 0 raises error."""
         with pytest.raises(StockError) as exc:
-            stock.receive(Decimal('0'), product, vitrine, reason='Zero')
+            stock.receive(D0, product, vitrine, reason='Zero')
         
         assert exc.value.code == 'INVALID_QUANTITY'
 
@@ -94,19 +114,19 @@ class TestStockIssue:
     
     def test_issue_decrements_quantity(self, product, vitrine):
         """Issue decrements Quant quantity."""
-        quant = stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        move = stock.issue(Decimal('30'), quant, reason='Saída')
+        quant = stock.receive(D100, product, vitrine, reason='Entrada')
+        move = stock.issue(D30, quant, reason='Saída')
         
-        quant.refresh_from_db()
-        assert quant._quantity == Decimal('70')
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == D70
         assert move.delta == Decimal('-30')
     
     def test_issue_insufficient_quantity(self, product, vitrine):
         """Issue more than available raises error."""
-        quant = stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D10, product, vitrine, reason='Entrada')
         
         with pytest.raises(StockError) as exc:
-            stock.issue(Decimal('20'), quant, reason='Saída')
+            stock.issue(D20, quant, reason='Saída')
         
         assert exc.value.code == 'INSUFFICIENT_QUANTITY'
 
@@ -116,19 +136,19 @@ class TestStockHold:
     
     def test_hold_creates_pending_hold(self, product, vitrine, today):
         """Hold creates a PENDING hold."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         
         assert hold_id.startswith('hold:')
         
         hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
         assert hold.status == HoldStatus.PENDING
-        assert hold.quantity == Decimal('10')
+        assert hold.quantity == D10
     
     def test_hold_insufficient_available(self, product, today):
         """Hold without stock raises error."""
         with pytest.raises(StockError) as exc:
-            stock.hold(Decimal('10'), product, today)
+            stock.hold(D10, product, today)
         
         assert exc.value.code == 'INSUFFICIENT_AVAILABLE'
     
@@ -140,12 +160,12 @@ class TestStockHold:
         assert hold.is_demand
         assert hold.quant is None
     
-    def test_hold_with_expiration(self, product, vitrine, today):
+    def test_hold_with_expiration(self, product, vitrine, today, now):
         """Hold with expiration is set."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        expires = timezone.now() + timedelta(minutes=15)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        expires = now + timedelta(minutes=15)
         
-        hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        hold_id = stock.hold(D10, product, today, expires_at=expires)
         
         hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
         assert hold.expires_at is not None
@@ -156,8 +176,8 @@ class TestStockConfirm:
     
     def test_confirm_pending_to_confirmed(self, product, vitrine, today):
         """Confirm changes status from PENDING to CONFIRMED."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         
         hold = stock.confirm(hold_id)
         
@@ -165,14 +185,21 @@ class TestStockConfirm:
     
     def test_confirm_invalid_status(self, product, vitrine, today):
         """Confirm non-PENDING hold raises error."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         stock.confirm(hold_id)  # Now CONFIRMED
         
         with pytest.raises(StockError) as exc:
             stock.confirm(hold_id)  # Already CONFIRMED
         
         assert exc.value.code == 'INVALID_STATUS'
+    
+    def test_confirm_unknown_hold(self):
+        """Confirm of a missing hold raises INVALID_HOLD."""
+        with pytest.raises(StockError) as exc:
+            stock.confirm('hold:999999')
+        
+        assert exc.value.code == 'INVALID_HOLD'
 
 
 class TestStockRelease:
@@ -180,18 +207,27 @@ class TestStockRelease:
     
     def test_release_pending(self, product, vitrine, today):
         """Release PENDING hold."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         
         hold = stock.release(hold_id, reason='Cancelado')
         
         assert hold.status == HoldStatus.RELEASED
-        assert stock.available(product, today) == Decimal('100')  # Freed up
+        assert stock.available(product, today) == D100  # Freed up
+    
+    def test_release_records_reason(self, product, vitrine, today):
+        """Release stores the reason without dropping other metadata."""
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today, channel='web')
+        
+        hold = stock.release(hold_id, reason='Cancelado')
+        
+        assert hold.metadata == {'channel': 'web', 'release_reason': 'Cancelado'}
     
     def test_release_confirmed(self, product, vitrine, today):
         """Release CONFIRMED hold."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         stock.confirm(hold_id)
         
         hold = stock.release(hold_id, reason='Cancelado')
@@ -199,13 +235,52 @@ class TestStockRelease:
         assert hold.status == HoldStatus.RELEASED
 
 
+class TestStockReleaseMany:
+    """Tests for stock.release_many()."""
+
+    def test_releases_active_and_skips_resolved(self, product, vitrine, today):
+        """Active holds are released in one call; already released ones are skipped."""
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        pending = stock.hold(D10, product, today, channel='web')
+        confirmed = stock.hold(D20, product, today)
+        stock.confirm(confirmed)
+        released = stock.hold(D30, product, today)
+        stock.release(released, reason='Antes')
+
+        count = stock.release_many([pending, confirmed, released], reason='Pedido cancelado')
+
+        assert count == 2
+        assert stock.available(product, today) == D100
+        hold = Hold.objects.get(pk=int(pending.split(':')[1]))
+        assert hold.status == HoldStatus.RELEASED
+        assert hold.metadata == {'channel': 'web', 'release_reason': 'Pedido cancelado'}
+        # The skipped hold keeps its original reason
+        hold = Hold.objects.get(pk=int(released.split(':')[1]))
+        assert hold.metadata['release_reason'] == 'Antes'
+
+    def test_malformed_id_releases_nothing(self, product, vitrine, today):
+        """A malformed hold_id raises INVALID_HOLD before any hold is released."""
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
+
+        with pytest.raises(StockError) as exc:
+            stock.release_many([hold_id, 'hold:abc'])
+
+        assert exc.value.code == 'INVALID_HOLD'
+        assert stock.available(product, today) == Decimal('90')
+
+    def test_empty_input(self):
+        """No hold ids, nothing released."""
+        assert stock.release_many([]) == 0
+
+
 class TestStockFulfill:
     """Tests for stock.fulfill()."""
     
     def test_fulfill_creates_move(self, product, vitrine, today):
         """Fulfill creates exit Move."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        hold_id = stock.hold(Decimal('10'), product, today)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        hold_id = stock.hold(D10, product, today)
         stock.confirm(hold_id)
         
         move = stock.fulfill(hold_id)
@@ -225,18 +300,22 @@ class TestStockFulfill:
             stock.fulfill(hold_id)
         
         assert exc.value.code == 'HOLD_IS_DEMAND'
+        
+        # The status transition is rolled back with the error
+        hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
+        assert hold.status == HoldStatus.CONFIRMED
 
 
 class TestStockReleaseExpired:
     """Tests for stock.release_expired()."""
     
-    def test_release_expired_holds(self, product, vitrine, today):
+    def test_release_expired_holds(self, product, vitrine, today, now):
         """Expired holds are released."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
         
         # Create hold that expired 1 minute ago
-        expires = timezone.now() - timedelta(minutes=1)
-        hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        expires = now - timedelta(minutes=1)
+        hold_id = stock.hold(D10, product, today, expires_at=expires)
         
         count = stock.release_expired()
         
@@ -253,7 +332,7 @@ class TestExpiredHoldsIgnored:
     regardless of whether the cron has run to clean up expired holds.
     """
     
-    def test_available_ignores_expired_holds_before_cron(self, product, vitrine, today):
+    def test_available_ignores_expired_holds_before_cron(self, product, vitrine, today, now):
         """
         Expired holds should not block availability, even before cron runs.
         
@@ -263,11 +342,11 @@ class TestExpiredHoldsIgnored:
         3. Cron: NOT run yet (hold still has PENDING status)
         4. Expected: available = 100 (not 90)
         """
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
         
         # Create hold that expired 1 minute ago
-        expires = timezone.now() - timedelta(minutes=1)
-        hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        expires = now - timedelta(minutes=1)
+        hold_id = stock.hold(D10, product, today, expires_at=expires)
         
         # Verify hold is still PENDING in database
         hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
@@ -275,14 +354,14 @@ class TestExpiredHoldsIgnored:
         
         # But availability should ignore it
         available = stock.available(product, today)
-        assert available == Decimal('100'), "Expired hold should not block availability"
+        assert available == D100, "Expired hold should not block availability"
     
-    def test_hold_is_active_false_when_expired(self, product, vitrine, today):
+    def test_hold_is_active_false_when_expired(self, product, vitrine, today, now):
         """Hold.is_active should return False when expired."""
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        stock.receive(D100, product, vitrine, reason='Entrada')
         
-        expires = timezone.now() - timedelta(minutes=1)
-        hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        expires = now - timedelta(minutes=1)
+        hold_id = stock.hold(D10, product, today, expires_at=expires)
         
         hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
         
@@ -292,40 +371,51 @@ class TestExpiredHoldsIgnored:
         assert hold.is_active is False
         assert hold.is_expired is True
     
-    def test_quant_held_ignores_expired_holds(self, product, vitrine, today):
+    def test_quant_held_ignores_expired_holds(self, product, vitrine, today, now):
         """Quant.held property should ignore expired holds."""
-        quant = stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D100, product, vitrine, reason='Entrada')
         
         # Create two holds: one valid, one expired
-        valid_expires = timezone.now() + timedelta(minutes=10)
-        expired_expires = timezone.now() - timedelta(minutes=1)
+        valid_expires = now + timedelta(minutes=10)
+        expired_expires = now - timedelta(minutes=1)
         
-        stock.hold(Decimal('20'), product, today, expires_at=valid_expires)
-        stock.hold(Decimal('30'), product, today, expires_at=expired_expires)
-        
-        quant.refresh_from_db()
+        stock.hold(D20, product, today, expires_at=valid_expires)
+        stock.hold(D30, product, today, expires_at=expired_expires)
         
         # Only valid hold should be counted
-        assert quant.held == Decimal('20'), "Expired hold should not be counted in held"
-        assert quant.available == Decimal('80'), "Available should be 100 - 20 = 80"
-    
-    def test_new_hold_succeeds_when_old_expired(self, product, vitrine, today):
+        assert quant.held == D20, "Expired hold should not be counted in held"
+        assert quant.available == D80, "Available should be 100 - 20 = 80"
+
+    def test_quant_held_uses_with_held_annotation(
+        self, product, vitrine, today, django_assert_num_queries
+    ):
+        """Quants loaded via with_held() answer held/available without queries."""
+        quant = stock.receive(D100, product, vitrine, reason='Entrada')
+        stock.hold(D20, product, today)
+
+        quant = Quant.objects.with_held().get(pk=quant.pk)
+
+        with django_assert_num_queries(0):
+            assert quant.held == D20
+            assert quant.available == D80
+
+    def test_new_hold_succeeds_when_old_expired(self, product, vitrine, today, now):
         """Can create new hold when old one expired (before cron)."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
         
         # First hold takes all 10 units, but expires
-        expires = timezone.now() - timedelta(minutes=1)
-        old_hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        expires = now - timedelta(minutes=1)
+        old_hold_id = stock.hold(D10, product, today, expires_at=expires)
         
         # Old hold is still PENDING in database
         old_hold = Hold.objects.get(pk=int(old_hold_id.split(':')[1]))
         assert old_hold.status == HoldStatus.PENDING
         
         # But we should be able to create a new hold for the same quantity
-        new_hold_id = stock.hold(Decimal('10'), product, today)
+        new_hold_id = stock.hold(D10, product, today)
         
         assert new_hold_id != old_hold_id
-        assert stock.available(product, today) == Decimal('0')
+        assert stock.available(product, today) == D0
 
 
 class TestStockHoldRaceCondition:
@@ -333,8 +423,8 @@ class TestStockHoldRaceCondition:
 
     def test_hold_after_stock_exhausted_returns_stock_error(self, product, vitrine, today):
         """Hold when stock is 0 raises StockError, not NameError."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
-        stock.hold(Decimal('10'), product, today)
+        stock.receive(D10, product, vitrine, reason='Entrada')
+        stock.hold(D10, product, today)
 
         with pytest.raises(StockError) as exc:
             stock.hold(Decimal('1'), product, today)
@@ -343,7 +433,7 @@ class TestStockHoldRaceCondition:
 
     def test_hold_insufficient_reports_current_available(self, product, vitrine, today):
         """StockError includes actual available quantity."""
-        stock.receive(Decimal('10'), product, vitrine, reason='Entrada')
+        stock.receive(D10, product, vitrine, reason='Entrada')
         stock.hold(Decimal('7'), product, today)
 
         with pytest.raises(StockError) as exc:
@@ -360,27 +450,27 @@ class TestStockAvailableWithPosition:
         self, product, vitrine, producao, today
     ):
         """Hold in position B should not affect available in position A."""
-        stock.receive(Decimal('50'), product, vitrine, reason='Entrada vitrine')
-        stock.receive(Decimal('50'), product, producao, reason='Entrada producao')
+        stock.receive(D50, product, vitrine, reason='Entrada vitrine')
+        stock.receive(D50, product, producao, reason='Entrada producao')
 
         # Hold on vitrine quant
-        stock.hold(Decimal('30'), product, today)
+        stock.hold(D30, product, today)
 
         # Available in producao should be unaffected
         avail_producao = stock.available(product, today, position=producao)
-        assert avail_producao == Decimal('50')
+        assert avail_producao == D50
 
     def test_available_all_positions_includes_all_holds(
         self, product, vitrine, producao, today
     ):
         """Available without position sums all quants minus all holds."""
-        stock.receive(Decimal('50'), product, vitrine, reason='Entrada vitrine')
-        stock.receive(Decimal('50'), product, producao, reason='Entrada producao')
+        stock.receive(D50, product, vitrine, reason='Entrada vitrine')
+        stock.receive(D50, product, producao, reason='Entrada producao')
 
-        stock.hold(Decimal('30'), product, today)
+        stock.hold(D30, product, today)
 
         avail_all = stock.available(product, today)
-        assert avail_all == Decimal('70')
+        assert avail_all == D70
 
 
 class TestStockRecalculate:
@@ -388,27 +478,27 @@ class TestStockRecalculate:
 
     def test_recalculate_fixes_inconsistency(self, product, vitrine):
         """Recalculate corrects _quantity when it drifts from moves."""
-        quant = stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D100, product, vitrine, reason='Entrada')
 
         # Force inconsistency by directly updating _quantity
         Quant.objects.filter(pk=quant.pk).update(_quantity=Decimal('999'))
-        quant.refresh_from_db()
+        quant.refresh_from_db(fields=['_quantity'])
         assert quant._quantity == Decimal('999')
 
         result = quant.recalculate()
 
-        assert result == Decimal('100')
-        quant.refresh_from_db()
-        assert quant._quantity == Decimal('100')
+        assert result == D100
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == D100
 
     def test_recalculate_noop_when_consistent(self, product, vitrine):
         """Recalculate does nothing when _quantity matches moves."""
-        quant = stock.receive(Decimal('50'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
 
         result = quant.recalculate()
 
-        assert result == Decimal('50')
-        assert quant._quantity == Decimal('50')
+        assert result == D50
+        assert quant._quantity == D50
 
 
 class TestStockAdjustDeltaZero:
@@ -416,10 +506,10 @@ class TestStockAdjustDeltaZero:
 
     def test_adjust_delta_zero_returns_none(self, product, vitrine):
         """Adjust with same quantity returns None and creates no Move."""
-        quant = stock.receive(Decimal('50'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
         initial_moves = quant.moves.count()
 
-        result = stock.adjust(quant, Decimal('50'), reason='Conferência')
+        result = stock.adjust(quant, D50, reason='Conferência')
 
         assert result is None
         assert quant.moves.count() == initial_moves
@@ -428,28 +518,22 @@ class TestStockAdjustDeltaZero:
 class TestManagementCommandReleaseExpiredHolds:
     """S12: Test management command release_expired_holds."""
 
-    def test_command_releases_expired(self, product, vitrine, today):
+    def test_command_releases_expired(self, product, vitrine, today, now):
         """Command releases expired holds."""
-        from django.core.management import call_command
-        from io import StringIO
-
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        expires = timezone.now() - timedelta(minutes=1)
-        stock.hold(Decimal('10'), product, today, expires_at=expires)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        expires = now - timedelta(minutes=1)
+        stock.hold(D10, product, today, expires_at=expires)
 
         out = StringIO()
         call_command('release_expired_holds', stdout=out)
 
         assert '1 bloqueio(s) liberado(s)' in out.getvalue()
 
-    def test_command_dry_run(self, product, vitrine, today):
+    def test_command_dry_run(self, product, vitrine, today, now):
         """Command --dry-run shows count without releasing."""
-        from django.core.management import call_command
-        from io import StringIO
-
-        stock.receive(Decimal('100'), product, vitrine, reason='Entrada')
-        expires = timezone.now() - timedelta(minutes=1)
-        hold_id = stock.hold(Decimal('10'), product, today, expires_at=expires)
+        stock.receive(D100, product, vitrine, reason='Entrada')
+        expires = now - timedelta(minutes=1)
+        hold_id = stock.hold(D10, product, today, expires_at=expires)
 
         out = StringIO()
         call_command('release_expired_holds', '--dry-run', stdout=out)
@@ -466,30 +550,359 @@ class TestStockPlan:
 
     def test_plan_creates_future_quant(self, product, friday):
         """Plan creates Quant with target_date."""
-        quant = stock.plan(Decimal('50'), product, friday, reason='Produção')
+        quant = stock.plan(D50, product, friday, reason='Produção')
 
         assert quant.target_date == friday
-        assert quant._quantity == Decimal('50')
+        assert quant._quantity == D50
         assert quant.is_future
 
 
+class TestStockRealize:
+    """Tests for stock.realize()."""
+
+    def test_realize_adjust_and_transfer_same_quant(self, product, vitrine, friday):
+        """Adjust and transfer moves on the planned quant are summed: it ends at 0."""
+        planned = stock.plan(D50, product, friday, reason='Produção')
+        hold_id = stock.hold(D10, product, friday)
+
+        physical = stock.realize(product, friday, Decimal('45'), vitrine)
+
+        planned.refresh_from_db(fields=['_quantity'])
+        assert planned._quantity == D0
+        assert planned.recalculate() == D0
+        assert planned.moves.count() == 3  # plan, adjust, transfer out
+
+        assert physical.target_date is None
+        assert physical._quantity == Decimal('45')
+        assert physical.recalculate() == Decimal('45')
+
+        hold = Hold.objects.get(pk=int(hold_id.split(':')[1]))
+        assert hold.quant_id == physical.pk
+        assert hold.status == HoldStatus.PENDING
+
+    def test_realize_without_adjust(self, product, vitrine, friday):
+        """Realizing the planned quantity only transfers."""
+        planned = stock.plan(D50, product, friday, reason='Produção')
+
+        physical = stock.realize(product, friday, D50, vitrine)
+
+        planned.refresh_from_db(fields=['_quantity'])
+        assert planned._quantity == D0
+        assert planned.moves.count() == 2  # plan, transfer out
+        assert physical._quantity == physical.recalculate() == D50
+
+    def test_realize_without_plan(self, product, vitrine, friday):
+        """Realize with no planned quant raises QUANT_NOT_FOUND."""
+        with pytest.raises(StockError) as exc:
+            stock.realize(product, friday, D50, vitrine)
+
+        assert exc.value.code == 'QUANT_NOT_FOUND'
+
+
+class TestMoveBulkCreate:
+    """Tests for Move.objects.bulk_create() guards and quant sync."""
+
+    def test_bulk_create_sums_deltas_per_quant(self, product, vitrine):
+        """Several moves on one quant update its cache once, by their sum."""
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
+
+        Move.objects.bulk_create([
+            Move(quant=quant, delta=D20, reason='Entrada'),
+            Move(quant=quant, delta=-D10, reason='Saída'),
+        ])
+
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == Decimal('60')
+        assert quant.recalculate() == Decimal('60')
+
+    @pytest.mark.parametrize('option', [
+        {'ignore_conflicts': True},
+        {'update_conflicts': True, 'unique_fields': ['id'], 'update_fields': ['delta']},
+    ])
+    def test_bulk_create_rejects_conflict_handling(self, product, vitrine, option):
+        """ignore/update conflicts would skip rows the quant update still counts."""
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
+
+        with pytest.raises(ValueError, match="conflitos"):
+            Move.objects.bulk_create([Move(quant=quant, delta=D10, reason='Entrada')], **option)
+
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == D50
+        assert quant.moves.count() == 1
+
+    def test_bulk_create_rejects_saved_move(self, product, vitrine):
+        """A move that already has a pk is immutable."""
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
+        move = quant.moves.first()
+
+        with pytest.raises(ValueError, match="imutáveis"):
+            Move.objects.bulk_create([move])
+
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == D50
+
+    def test_bulk_create_requires_reason(self, product, vitrine):
+        """Every move needs a reason; nothing is inserted otherwise."""
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
+
+        with pytest.raises(ValueError, match="Motivo é obrigatório"):
+            Move.objects.bulk_create([
+                Move(quant=quant, delta=D10, reason='Entrada'),
+                Move(quant=quant, delta=D10, reason=''),
+            ])
+
+        quant.refresh_from_db(fields=['_quantity'])
+        assert quant._quantity == D50
+        assert quant.moves.count() == 1
+
+
 class TestMoveImmutability:
     """Tests for Move immutability."""
     
     def test_move_cannot_be_updated(self, product, vitrine):
         """Move save with pk raises error."""
-        quant = stock.receive(Decimal('50'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
         move = quant.moves.first()
         
-        move.delta = Decimal('100')
+        move.delta = D100
         with pytest.raises(ValueError, match="imutáveis"):
             move.save()
     
     def test_move_cannot_be_deleted(self, product, vitrine):
         """Move delete raises error."""
-        quant = stock.receive(Decimal('50'), product, vitrine, reason='Entrada')
+        quant = stock.receive(D50, product, vitrine, reason='Entrada')
         move = quant.moves.first()
         
         with pytest.raises(ValueError, match="imutáveis"):
             move.delete()
 
+
+
+class TestAvailabilityCache:
+    """Tests for the opt-in available()/committed() read cache."""
+
+    @pytest.fixture(autouse=True)
+    def _reset_cache(self):
+        reset_cache()
+        yield
+        reset_cache()
+
+    def _direct_hold(self, quant, product, today, quantity):
+        """Create a Hold bypassing the services (no cache invalidation)."""
+        return Hold.objects.create(
+            quant=quant,
+            content_type=quant.content_type,
+            object_id=product.pk,
+            target_date=today,
+            quantity=quantity,
+        )
+
+    def test_disabled_by_default(self, product, product_ct, vitrine, today):
+        """Without AVAILABILITY_CACHE_TTL, every call hits the database."""
+        quant = Quant.objects.create(
+            content_type=product_ct,
+            object_id=product.pk,
+            position=vitrine,
+            _quantity=D50,
+        )
+        assert stock.available(product, today) == D50
+
+        self._direct_hold(quant, product, today, D20)
+
+        assert stock.available(product, today) == D30
+
+    def test_cached_until_service_write(self, settings, product, product_ct, vitrine, today):
+        """Cached value is reused until a service write invalidates it."""
+        settings.STOCKMAN = {'AVAILABILITY_CACHE_TTL': 60}
+        quant = Quant.objects.create(
+            content_type=product_ct,
+            object_id=product.pk,
+            position=vitrine,
+            _quantity=D50,
+        )
+        assert stock.available(product, today) == D50
+
+        # Out-of-band write: not seen while the entry is fresh
+        self._direct_hold(quant, product, today, D20)
+        assert stock.available(product, today) == D50
+
+        # Service write invalidates (20 direct + 5 via service)
+        stock.hold(Decimal('5'), product, today)
+        assert stock.available(product, today) == Decimal('25')
+
+    def test_reads_inside_transaction_not_cached(self, settings, product, product_ct, vitrine, today):
+        """A read inside atomic() may see uncommitted rows: it's never stored."""
+        settings.STOCKMAN = {'AVAILABILITY_CACHE_TTL': 60}
+        quant = Quant.objects.create(
+            content_type=product_ct,
+            object_id=product.pk,
+            position=vitrine,
+            _quantity=D50,
+        )
+
+        with transaction.atomic():
+            self._direct_hold(quant, product, today, D20)
+            assert stock.available(product, today) == D30
+            transaction.set_rollback(True)
+
+        assert stock.available(product, today) == D50
+
+    def test_read_across_invalidation_not_cached(self, settings, product, product_ct):
+        """A value computed while the product was invalidated is not stored."""
+        settings.STOCKMAN = {'AVAILABILITY_CACHE_TTL': 60}
+        key = ('available', None, None)
+
+        def read_before_commit():
+            # Writer commits (on_commit drop) while this read is in flight
+            cache._drop((product_ct.pk, product.pk))
+            return D50
+
+        assert cache.cached(key, product_ct.pk, product.pk, read_before_commit) == D50
+        assert cache.cached(key, product_ct.pk, product.pk, lambda: D30) == D30
+        # Stored once computed without interference
+        assert cache.cached(key, product_ct.pk, product.pk, lambda: D0) == D30
+
+
+class TestCheckAlerts:
+    """Tests for check_alerts()."""
+
+    def _alert(self, product_ct, product, min_quantity, position=None, **fields):
+        return StockAlert.objects.create(
+            content_type=product_ct,
+            object_id=product.pk,
+            position=position,
+            min_quantity=min_quantity,
+            **fields,
+        )
+
+    def test_triggered_below_min_quantity(self, product, product_ct, vitrine, today):
+        """Alert triggers when available (on hand minus holds) < min_quantity."""
+        stock.receive(D50, product, vitrine, reason='Entrada')
+        stock.hold(D10, product, today)
+        alert = self._alert(product_ct, product, D50)
+
+        triggered = check_alerts()
+
+        assert [(a.pk, available) for a, available in triggered] == [(alert.pk, Decimal('40'))]
+
+    def test_not_triggered_at_or_above_min_quantity(self, product, product_ct, vitrine, today):
+        """Alert stays quiet while available >= min_quantity."""
+        stock.receive(D50, product, vitrine, reason='Entrada')
+        stock.hold(D10, product, today)
+        self._alert(product_ct, product, Decimal('40'))
+
+        assert check_alerts() == []
+
+    def test_inactive_alert_ignored(self, product, product_ct):
+        """Inactive alerts are never triggered."""
+        self._alert(product_ct, product, D10, is_active=False)
+
+        assert check_alerts() == []
+
+    def test_position_scoped_vs_all_positions(self, product, product_ct, vitrine, producao, today):
+        """Position alerts count only their position; others sum all positions."""
+        stock.receive(D50, product, vitrine, reason='Entrada')
+        stock.receive(Decimal('5'), product, producao, reason='Entrada')
+        at_producao = self._alert(product_ct, product, D10, position=producao)
+        self._alert(product_ct, product, D10, position=vitrine)
+        self._alert(product_ct, product, D50)  # 55 across positions
+
+        triggered = check_alerts()
+
+        assert [(a.pk, available) for a, available in triggered] == [(at_producao.pk, Decimal('5'))]
+        assert triggered[0][0].position == producao
+
+    def test_all_positions_alert_triggers_on_sum(self, product, product_ct, vitrine, producao):
+        """The all-positions alert compares the sum over every position."""
+        stock.receive(D20, product, vitrine, reason='Entrada')
+        stock.receive(D10, product, producao, reason='Entrada')
+        alert = self._alert(product_ct, product, D50)
+
+        triggered = check_alerts()
+
+        assert [(a.pk, available) for a, available in triggered] == [(alert.pk, D30)]
+
+    def test_product_filter(self, product, perishable_product, product_ct):
+        """product= restricts the check to that product's alerts."""
+        alert = self._alert(product_ct, product, D10)
+        self._alert(product_ct, perishable_product, D10)
+
+        triggered = check_alerts(product=product)
+
+        assert [(a.pk, available) for a, available in triggered] == [(alert.pk, D0)]
+        assert len(check_alerts()) == 2
+
+    def test_last_triggered_at_persisted(self, product, perishable_product, product_ct, vitrine, now):
+        """Triggered alerts get last_triggered_at saved; quiet ones keep None."""
+        stock.receive(D50, product, vitrine, reason='Entrada')
+        quiet = self._alert(product_ct, product, D10)
+        fired = self._alert(product_ct, perishable_product, D10)
+
+        check_alerts()
+
+        fired.refresh_from_db(fields=['last_triggered_at'])
+        quiet.refresh_from_db(fields=['last_triggered_at'])
+        assert fired.last_triggered_at == now
+        assert quiet.last_triggered_at is None
+
+
+class TestReadIsolated:
+    """Tests for the QUERY_ISOLATION_LEVEL wrapper of read-only queries."""
+
+    @staticmethod
+    @read_isolated
+    def _read():
+        return connection.in_atomic_block
+
+    # Outside the test's transaction, so the SET branch really runs;
+    # transactional tests run last, after the session fixtures' users
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason="SET TRANSACTION ISOLATION LEVEL is applied on PostgreSQL only",
+    )
+    def test_sets_level_outside_transaction(self, settings):
+        """The wrapped call runs in its own transaction at the configured level."""
+        settings.STOCKMAN = {'QUERY_ISOLATION_LEVEL': 'repeatable read'}
+
+        @read_isolated
+        def show_level():
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW transaction_isolation')
+                return cursor.fetchone()[0], connection.in_atomic_block
+
+        assert show_level() == ('repeatable read', True)
+        assert not connection.in_atomic_block
+
+    def test_invalid_level_raises(self, settings):
+        """An unknown level is rejected on every backend, not silently ignored."""
+        settings.STOCKMAN = {'QUERY_ISOLATION_LEVEL': 'SERIALIZABLE'}
+
+        with pytest.raises(ValueError, match='QUERY_ISOLATION_LEVEL'):
+            self._read()
+
+    def test_noop_inside_atomic_block(self, settings, monkeypatch, django_assert_num_queries):
+        """Inside a transaction (the test's own) the level is left alone."""
+        settings.STOCKMAN = {'QUERY_ISOLATION_LEVEL': 'read committed'}
+        monkeypatch.setattr(connection, 'vendor', 'postgresql')
+
+        with django_assert_num_queries(0):
+            assert self._read() is True
+
+    def test_noop_on_other_backends(self, settings, monkeypatch, django_assert_num_queries):
+        """Outside PostgreSQL no transaction is opened and nothing is SET."""
+        settings.STOCKMAN = {'QUERY_ISOLATION_LEVEL': 'REPEATABLE READ'}
+        monkeypatch.setattr(connection, 'vendor', 'sqlite')
+
+        with django_assert_num_queries(0), monkeypatch.context() as m:
+            m.setattr(connection, 'in_atomic_block', False)
+            assert self._read() is False
+
+    def test_default_leaves_connection_untouched(self, settings, monkeypatch, django_assert_num_queries):
+        """With the default "" the call runs as is, even on PostgreSQL."""
+        settings.STOCKMAN = {}
+        monkeypatch.setattr(connection, 'vendor', 'postgresql')
+
+        with django_assert_num_queries(0), monkeypatch.context() as m:
+            m.setattr(connection, 'in_atomic_block', False)
+            assert self._read() is False